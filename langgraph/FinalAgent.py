@@ -1,33 +1,81 @@
 import os
 import asyncio
 import json
-from typing import Annotated, Sequence, TypedDict, List, Dict, Any
+import time
+from typing import Annotated, Sequence, TypedDict, List, Dict, Any, Optional, AsyncIterator, Set, Tuple, Type
 from dotenv import load_dotenv
-from pydantic import BaseModel, Field
-from crawl4ai import AsyncWebCrawler, CrawlerRunConfig, CacheMode
+from pydantic import BaseModel, Field, ValidationError
+from crawl4ai import CrawlerRunConfig, CacheMode
 from crawl4ai.extraction_strategy import LLMExtractionStrategy
-from crawl4ai.async_configs import LLMConfig
+from concurrent_fetch import iter_fetch, HostLimiter, CRAWL_MAX_WORKERS, CRAWL_PER_HOST_LIMIT
+from seen_store import SeenURLStore
+from link_extractor import extract_article_links
+from extraction_cache import ExtractionCache, schema_key, page_content_hash, page_markdown
+from batch_extract import batch_extract, pack_batches
+from browser_pool import CrawlerPool, get_crawler_pool, close_crawler_pool
+from http_fetch import fetch_page, close_http_fetcher
+from page_pruner import prune_page, estimate_tokens, truncate_to_tokens, PAGE_PRUNE_ENABLED
+from news_sources import SOURCES, get_source, source_urls
+from crawl_checkpoint import CrawlCheckpoint, finish_runs, record_failures, ANALYZE_MAX_ATTEMPTS
+from near_dup import NearDupIndex, article_key, collapse_near_duplicates, NEAR_DUP_ENABLED
+from llm_cache import CachedLLM, close_llm_cache
+from llm_clients import get_llm_clients, close_llm_clients
+from llm_resilience import ProviderError, message_status
+from impact_lexicon import LexiconStats, get_impact_lexicon, SOURCE_COLUMN, SOURCE_LEXICON
+from security_master import get_security_master, EXTRACT_ENTITIES_LOCAL
+from universe import UniverseStats, get_universe, code_digits
+from record_store import RecordStore
 from langchain_core.messages import BaseMessage, ToolMessage, SystemMessage, HumanMessage
 from langchain_core.tools import tool
 from langgraph.graph.message import add_messages
 from langgraph.graph import StateGraph, END
 from langgraph.prebuilt import ToolNode
-import csv
-from langchain_community.chat_models import ChatTongyi
 from langchain_community.llms import Tongyi
-from langchain_community.chat_models.tongyi import ChatTongyi
 import re
 
 
 
 load_dotenv()
 
+# 是否跳过已处理过的新闻 URL（设置 CRAWL_SKIP_SEEN=0 可强制全量抓取）
+CRAWL_SKIP_SEEN = os.getenv("CRAWL_SKIP_SEEN", "1") != "0"
+# 是否把多篇文章打包进同一个 LLM 请求进行抽取（EXTRACT_BATCH_MODE=1 开启）
+EXTRACT_BATCH_MODE = os.getenv("EXTRACT_BATCH_MODE", "0") == "1"
+# 流式模式：抓取到的新闻通过有界队列直接进入分析和保存（PIPELINE_STREAM_MODE=1 开启）
+PIPELINE_STREAM_MODE = os.getenv("PIPELINE_STREAM_MODE", "0") == "1"
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "16"))
+# 流式模式下同时进行分析的消费者数；每个消费者一次取走队列中已就绪的至多 STREAM_ANALYZE_BATCH 篇文章一起分析，
+# 使短讯打包和并发分析在流式模式下同样生效
+STREAM_ANALYZE_WORKERS = int(os.getenv("STREAM_ANALYZE_WORKERS", "4"))
+STREAM_ANALYZE_BATCH = int(os.getenv("STREAM_ANALYZE_BATCH", "8"))
+# 新闻影响分析同时进行的文章数上限；默认 0 表示不设固定上限，由 DashScope 容错层的 AIMD 限制控制并发
+ANALYZE_CONCURRENCY = int(os.getenv("ANALYZE_CONCURRENCY", "0"))
+# prompt 模板版本号，参与 LLM 响应缓存的键；修改对应 prompt 时需要同时修改
+ANALYSIS_PROMPT_VERSION = "article-v3"
+CHAT_PROMPT_VERSION = "chat-v1"
+# 结构化输出：通过 tool calling 让模型按 ArticleImpact 返回（ANALYZE_STRUCTURED_OUTPUT=0 时改为解析文本中的 JSON）
+ANALYZE_STRUCTURED_OUTPUT = os.getenv("ANALYZE_STRUCTURED_OUTPUT", "1") != "0"
+# 模型级联：先用便宜的模型打分，结果不合法、置信度低或与词典信号矛盾时升级到 qwen-plus（ANALYZE_CASCADE=1 开启）
+ANALYZE_CASCADE = os.getenv("ANALYZE_CASCADE", "0") == "1"
+ANALYZE_CASCADE_MODEL = os.getenv("ANALYZE_CASCADE_MODEL", "qwen-turbo")
+ANALYZE_CASCADE_MIN_CONFIDENCE = float(os.getenv("ANALYZE_CASCADE_MIN_CONFIDENCE", "0.7"))
+# 按正文长度路由：不超过 ANALYZE_SHORT_TOKENS 的短讯按 token 预算打包进同一个请求（ANALYZE_BATCH_MAX_ITEMS=1 关闭），
+# 超过 ANALYZE_LONG_TOKENS 的长文截断后单独分析
+ANALYZE_SHORT_TOKENS = int(os.getenv("ANALYZE_SHORT_TOKENS", "400"))
+ANALYZE_BATCH_TOKEN_BUDGET = int(os.getenv("ANALYZE_BATCH_TOKEN_BUDGET", "3000"))
+ANALYZE_BATCH_MAX_ITEMS = int(os.getenv("ANALYZE_BATCH_MAX_ITEMS", "8"))
+ANALYZE_LONG_TOKENS = int(os.getenv("ANALYZE_LONG_TOKENS", "3000"))
+
 # 状态定义
 class AgentState(TypedDict):
     messages: Annotated[Sequence[BaseMessage], add_messages]
     news_data: List[Dict[str, Any]]
     factor_data: List[Dict[str, Any]]
+    # 有公司没有得到因子结果的文章，保存时不结束检查点，下次运行重新分析
+    failed_urls: List[str]
     url: str
+    # 只抓取 url 本身，不附带其余已启用的来源（轮询守护进程按列表页分别调度时使用）
+    only_url: bool
 
 # Pydantic models
 class NewsURL(BaseModel):
@@ -41,6 +89,12 @@ class NewsContent(BaseModel):
     stock_code: str = Field(..., description="与涉及公司对应的唯一官方证券代码.")
     stock_short_name: str = Field(..., description="与涉及公司对应的交易所标准化简称.")
 
+class NewsArticle(BaseModel):
+    """本地标注公司时只抽取文章本身，公司、代码和简称由证券主数据补全"""
+    news_time: str = Field(..., description="新闻发布的时间,包括日期、时间,如 2023年10月5日 14:30.")
+    news_title: str = Field(..., description="新闻原文的完整标题，禁止修改或缩写.")
+    news_text: str = Field(..., description="新闻的全部正文内容.")
+
 class NewsImpact(BaseModel):
     company_name: str = Field(..., description="公司名称")
     stock_code: str = Field(..., description="股票代码")
@@ -49,6 +103,30 @@ class NewsImpact(BaseModel):
     news_title: str = Field(..., description="新闻标题")
     impact_direction: int = Field(..., description="影响方向: 1(正面)/-1(负面)/0(中性)")
     news_summary: str = Field(..., description="新闻摘要")
+    source: str = Field("llm", description="判定来源: llm(模型分析)/lexicon(词典判定)")
+
+class CompanyImpact(BaseModel):
+    stock_code: str = Field(..., description="证券代码，与涉及公司列表中的一致")
+    news_summary: str = Field(..., description="侧重该公司的一句话新闻摘要")
+    impact_direction: int = Field(..., ge=-1, le=1, description="影响方向: 1(正面)/-1(负面)/0(中性)")
+    # 默认 None 而不是 1.0：函数调用时模型可能省略有默认值的字段，省略的把握在级联中按 0 处理并升级
+    confidence: Optional[float] = Field(None, ge=0, le=1, description="对影响方向判断的把握，0到1之间，必须填写")
+
+class ArticleImpact(BaseModel):
+    """一篇新闻对每家涉及公司的影响"""
+    results: List[CompanyImpact] = Field(..., description="每家涉及公司一项")
+
+ARTICLE_IMPACT_FORMAT = '{"results": [{"stock_code": "证券代码", "news_summary": "这里是新闻摘要", "impact_direction": 影响方向数字, "confidence": 0到1之间的把握程度}]}'
+
+class BatchArticleImpact(BaseModel):
+    article_id: int = Field(..., description="新闻编号")
+    results: List[CompanyImpact] = Field(..., description="该新闻每家涉及公司一项")
+
+class BatchImpact(BaseModel):
+    """多篇新闻对各自涉及公司的影响"""
+    articles: List[BatchArticleImpact] = Field(..., description="每篇新闻一项")
+
+BATCH_IMPACT_FORMAT = '{"articles": [{"article_id": 新闻编号, "results": [{"stock_code": "证券代码", "news_summary": "这里是新闻摘要", "impact_direction": 影响方向数字, "confidence": 0到1之间的把握程度}]}]}'
 
 class NewsInput(BaseModel):
     news_data: List[Dict[str, Any]] = Field(..., description="新闻数据列表")
@@ -56,70 +134,8 @@ class NewsInput(BaseModel):
 class URLInput(BaseModel):
     user_query: str = Field(..., description="用户的查询或需求描述")
 
-# Tools
-@tool
-async def crawl_and_save_news(url: str) -> List[Dict[str, Any]]:
-    """
-    使用 crawl4ai 从给定 URL 抓取新闻并提取内容，同时保存原始新闻数据。
-    
-    参数
-        url： 要抓取新闻的 URL。默认为 eastmoney quick news。
-        
-    返回值
-        包含提取新闻内容的字典列表。
-    """
-    async with AsyncWebCrawler() as crawler:
-        # First layer: Extract news links
-        links_result = await crawler.arun(
-            url=url,
-            config=CrawlerRunConfig(
-                word_count_threshold=1,
-                extraction_strategy=LLMExtractionStrategy(
-                    llm_config=LLMConfig(
-                        provider="deepseek/deepseek-chat",
-                        api_token=os.getenv("DEEPSEEK_API_KEY"),
-                    ),
-                    schema=NewsURL.model_json_schema(),
-                    extraction_type="schema",
-                    instruction="""请提取所有新闻信息的url。示例：
-                    14:11[**【为了"出海"和"还贷" 锦江酒店拟启动港股IPO】** 
-                    从锦江酒店来看，其出海布局已进入实质阶段，而东南亚市场成为出海的重要落点。值得注意的是，公告还提到募资将用于偿还银行贷款。
-                    [点击查看全文]](https://finance.eastmoney.com/a/202506053422839540.html).我们需要返回的只有https://finance.eastmoney.com/a/202506053422839540.html"""
-                ),
-                cache_mode=CacheMode.BYPASS
-            )
-        )
-        
-        if not links_result.success or not links_result.extracted_content:
-            print("未找到任何新闻链接")
-            return []
-            
-        content = json.loads(links_result.extracted_content) if isinstance(links_result.extracted_content, str) else links_result.extracted_content
-        news_links = [item['url'] for item in content if isinstance(item, dict) and item.get('url')]
-        
-        total_links = len(news_links)
-        print(f"\n总共找到 {total_links} 条新闻链接")
-        print("开始提取新闻内容")        
-        # # 限制处理的链接数量为20条
-        # news_links = news_links[:2]
-        # print(f"将处理前 20 条新闻\n")
-        
-        # Second layer: Extract news content
-        all_news = []
-        for i, news_url in enumerate(news_links, 1):
-            print(f"正在处理第 {i}/{len(news_links)} 条新闻: {news_url}")
-            content_result = await crawler.arun(
-                url=news_url,
-                config=CrawlerRunConfig(
-                    word_count_threshold=1,
-                    extraction_strategy=LLMExtractionStrategy(
-                        llm_config=LLMConfig(
-                            provider="deepseek/deepseek-chat",
-                            api_token=os.getenv("DEEPSEEK_API_KEY"),
-                        ),
-                        schema=NewsContent.model_json_schema(),
-                        extraction_type="schema",
-                        instruction="""
+# 第二层新闻内容抽取的指令，同时参与抽取缓存的键
+NEWS_CONTENT_INSTRUCTION = """
                     请从新闻页面提取以下信息：
                                 1. news_time: 新闻发布的具体时间（格式：YYYY年MM月DD日 HH:mm）
                                 2. news_title: 新闻的完整标题
@@ -134,107 +150,834 @@ async def crawl_and_save_news(url: str) -> List[Dict[str, Any]]:
                                 - company_involved、stock_code和stock_short_name对应每家公司的具体信息
                                 - 如果找不到某个字段的信息，请返回空字符串""
                                 - 返回格式必须是JSON数组"""
-                    ),
-                    cache_mode=CacheMode.BYPASS,
-                )
+
+# 本地标注公司时的抽取指令
+NEWS_ARTICLE_INSTRUCTION = """
+                    请从新闻页面提取以下信息：
+                                1. news_time: 新闻发布的具体时间（格式：YYYY年MM月DD日 HH:mm）
+                                2. news_title: 新闻的完整标题
+                                3. news_text: 新闻的完整正文内容
+
+                                注意：
+                                - 如果找不到某个字段的信息，请返回空字符串""
+                                - 返回格式必须是JSON数组"""
+
+def content_extraction() -> Tuple[Type[BaseModel], str]:
+    """第二层抽取使用的 (schema, 指令)：有证券主数据且开启 EXTRACT_ENTITIES_LOCAL 时不再让 LLM 识别公司"""
+    if EXTRACT_ENTITIES_LOCAL and get_security_master() is not None:
+        return NewsArticle, NEWS_ARTICLE_INSTRUCTION
+    return NewsContent, NEWS_CONTENT_INSTRUCTION
+
+def resolve_entities(news_content: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """用本地证券主数据校验、补全公司字段；本地标注模式下把文章记录展开成每家公司一条"""
+    master = get_security_master()
+    if master is None:
+        return news_content
+    if content_extraction()[0] is NewsArticle:
+        return [record for article in news_content for record in master.expand(article)]
+    return [master.resolve(record) for record in news_content]
+
+def valid_records(records: List[Any], schema: Type[BaseModel] = NewsContent) -> List[Dict[str, Any]]:
+    """按 schema 校验抽取记录，丢弃缺字段或类型不对的记录，避免一条坏记录让后续分析整体失败"""
+    valid = []
+    for record in records:
+        try:
+            valid.append({**record, **schema.model_validate(record).model_dump()})
+        except (TypeError, ValidationError) as e:
+            print(f"丢弃不完整的抽取记录: {str(e)[:200]}")
+    return valid
+
+def news_content_config() -> CrawlerRunConfig:
+    """第二层新闻内容抽取的爬取配置"""
+    schema, instruction = content_extraction()
+    return CrawlerRunConfig(
+        word_count_threshold=1,
+        extraction_strategy=LLMExtractionStrategy(
+            llm_config=get_llm_clients().llm_config("deepseek"),
+            schema=schema.model_json_schema(),
+            extraction_type="schema",
+            instruction=instruction
+        ),
+        cache_mode=CacheMode.BYPASS,
+    )
+
+# 第一层链接提取的 LLM 兜底：仅在规则没有命中任何文章链接时调用
+async def llm_extract_news_links(crawler: CrawlerPool, url: str) -> List[str]:
+    """使用 DeepSeek 从列表页中提取新闻链接"""
+    links_result = await crawler.arun(
+        url=url,
+        config=CrawlerRunConfig(
+            word_count_threshold=1,
+            extraction_strategy=LLMExtractionStrategy(
+                llm_config=get_llm_clients().llm_config("deepseek"),
+                schema=NewsURL.model_json_schema(),
+                extraction_type="schema",
+                instruction="""请提取所有新闻信息的url。示例：
+                14:11[**【为了"出海"和"还贷" 锦江酒店拟启动港股IPO】** 
+                从锦江酒店来看，其出海布局已进入实质阶段，而东南亚市场成为出海的重要落点。值得注意的是，公告还提到募资将用于偿还银行贷款。
+                [点击查看全文]](https://finance.eastmoney.com/a/202506053422839540.html).我们需要返回的只有https://finance.eastmoney.com/a/202506053422839540.html"""
+            ),
+            cache_mode=CacheMode.BYPASS
+        )
+    )
+
+    if not links_result.success or not links_result.extracted_content:
+        return []
+
+    content = json.loads(links_result.extracted_content) if isinstance(links_result.extracted_content, str) else links_result.extracted_content
+    return [item['url'] for item in content if isinstance(item, dict) and item.get('url')]
+
+# 原始新闻 CSV 的字段映射：记录字段 -> CSV 列名
+NEWS_FIELD_MAPPING = {
+    'news_time': '时间',
+    'news_title': '标题',
+    'news_text': '正文',
+    'company_involved': '涉及公司',
+    'stock_code': '股票代码',
+    'stock_short_name': '股票简称'
+}
+
+# 因子 CSV 的字段映射：记录字段 -> CSV 列名
+FACTOR_FIELD_MAPPING = {
+    'company_name': '公司名',
+    'stock_code': '股票代码',
+    'stock_short_name': '股票简称',
+    'news_time': '新闻时间',
+    'news_title': '新闻标题',
+    'impact_direction': '影响方向',
+    'news_summary': '新闻摘要',
+    'source': SOURCE_COLUMN
+}
+
+async def iter_news_records(crawler: CrawlerPool, url: str, stats: Optional[Dict[str, int]] = None, claimed: Optional[set] = None, limiter: Optional[HostLimiter] = None) -> AsyncIterator[Tuple[str, List[Dict[str, Any]]]]:
+    """
+    从新闻列表页抓取新闻，每篇文章抽取完成后立即产出。
+
+    参数
+        crawler： 浏览器池（或任何提供 arun 的 AsyncWebCrawler）。
+        url： 新闻列表页 URL。
+        stats： 可选，用于回传 total_links / processed_links 统计。
+        claimed： 可选，多个来源共享的已认领文章 URL 集合，已被其他来源认领的文章会跳过。
+        limiter： 可选，多个来源共享的并发限制。
+
+    返回值
+        按完成顺序产出的 (文章 URL, NewsContent 记录列表)。
+    """
+    stats = stats if stats is not None else {}
+    stats.update(total_links=0, processed_links=0)
+
+    # First layer: Extract news links（先按站点规则提取，规则未命中时再交给 LLM）
+    page_result = await crawler.arun(
+        url=url,
+        config=CrawlerRunConfig(
+            word_count_threshold=1,
+            cache_mode=CacheMode.BYPASS
+        )
+    )
+
+    if not page_result.success:
+        print("列表页抓取失败")
+        return
+
+    # 已注册的来源使用自己的链接规则，其他列表页按 host 规则提取
+    source = get_source(url)
+    news_links = source.extract_links(page_result) if source else extract_article_links(page_result, url)
+    if news_links:
+        print("已按规则提取新闻链接")
+    else:
+        print("规则未命中，使用 LLM 提取新闻链接")
+        # 复用已抓取的 HTML，避免再次渲染列表页
+        news_links = await llm_extract_news_links(crawler, "raw:" + page_result.html)
+
+    if not news_links:
+        print("未找到任何新闻链接")
+        return
+
+    total_links = len(news_links)
+    stats["total_links"] = total_links
+    print(f"\n总共找到 {total_links} 条新闻链接")
+
+    # 增量抓取：跳过之前已经处理过的新闻
+    seen_store = SeenURLStore()
+    if CRAWL_SKIP_SEEN:
+        news_links = seen_store.filter_new(news_links)
+        print(f"其中 {total_links - len(news_links)} 条已处理过，跳过")
+    if claimed is not None:
+        unclaimed = [news_url for news_url in news_links if news_url not in claimed]
+        if len(unclaimed) < len(news_links):
+            print(f"其中 {len(news_links) - len(unclaimed)} 条已由其他来源抓取，跳过")
+        news_links = unclaimed
+        claimed.update(news_links)
+    if not news_links:
+        print("没有新的新闻需要处理")
+        seen_store.close()
+        return
+    stats["processed_links"] = len(news_links)
+    print("开始提取新闻内容")
+    # # 限制处理的链接数量为20条
+    # news_links = news_links[:2]
+    # print(f"将处理前 20 条新闻\n")
+
+    # Second layer: Extract news content (有限并发抓取 + 抽取结果缓存)
+    limiter = limiter or HostLimiter(CRAWL_MAX_WORKERS, CRAWL_PER_HOST_LIMIT)
+    extraction_cache = ExtractionCache()
+    content_schema, content_instruction = content_extraction()
+    content_schema_key = schema_key(content_schema.model_json_schema(), content_instruction)
+    # 批量模式下等待打包抽取的文章：url -> (内容哈希, 正文)
+    pending: Dict[str, tuple] = {}
+    # 页面裁剪前后的 token 总数
+    prune_stats = {"before": 0, "after": 0}
+
+    async def fetch_news_content(news_url: str) -> Optional[List[Dict[str, Any]]]:
+        print(f"正在处理新闻: {news_url}")
+        # 最近抽取过的新闻直接使用缓存，不渲染页面也不调用 LLM
+        cached = extraction_cache.get_fresh(news_url, content_schema_key)
+        if cached is not None:
+            print(f"命中抽取缓存: {news_url}")
+            return cached
+
+        # 静态站点先走 HTTP 快速通道，正文为空时才使用浏览器；只有访问站点时占用站点并发名额，
+        # 之后的 LLM 抽取由 DeepSeek 容错层控制并发
+        async with limiter.slot(news_url):
+            page_result = await fetch_page(crawler, news_url)
+        if not page_result.success:
+            return None
+
+        # 页面正文未变化时复用之前的抽取结果，跳过 LLM 调用；哈希只看正文，不受相关新闻、阅读数等变化影响
+        main = prune_page(page_result.html, news_url)
+        chash = page_content_hash(page_result, main.text if main is not None else "")
+        cached = extraction_cache.get(news_url, chash, content_schema_key)
+        if cached is not None:
+            print(f"页面内容未变化，使用缓存: {news_url}")
+            return cached
+
+        # 抽取前裁剪页面：只把标题、时间和正文送给 LLM
+        pruned = main if PAGE_PRUNE_ENABLED else None
+        if pruned is not None:
+            print(f"{pruned.report()}: {news_url}")
+            prune_stats["before"] += pruned.tokens_before
+            prune_stats["after"] += pruned.tokens_after
+
+        if EXTRACT_BATCH_MODE:
+            # 先收集正文，稍后与其他文章一起打包抽取
+            pending[news_url] = (chash, pruned.text if pruned is not None else page_markdown(page_result))
+            return None
+
+        extract_html = pruned.html if pruned is not None else page_result.html
+
+        async def extract() -> Optional[List[Dict[str, Any]]]:
+            content_result = await crawler.arun(url="raw:" + extract_html, config=news_content_config())
+            if not content_result.success or not content_result.extracted_content:
+                return None
+            records = json.loads(content_result.extracted_content) if isinstance(content_result.extracted_content, str) else content_result.extracted_content
+            if not isinstance(records, list):
+                records = [records]
+            # crawl4ai 把 LLM 调用异常写成 error 块放进结果，交给容错层重试，避免被当作记录缓存
+            errors = [r for r in records if isinstance(r, dict) and r.get("error")]
+            if errors:
+                # 保留错误类别：上下文超长、鉴权等 4xx 错误重试也不会成功，不重试也不计入熔断
+                message = str(errors[0].get("content", "抽取失败"))
+                raise ProviderError(message, message_status(message))
+            # 校验后再写入缓存和检查点
+            return valid_records(records, content_schema)
+
+        try:
+            news_content = await get_llm_clients().guard("deepseek").call(extract)
+        except Exception as e:
+            print(f"抽取新闻内容失败: {news_url}: {str(e)}")
+            return None
+        if not news_content:
+            return None
+        extraction_cache.put(news_url, chash, content_schema_key, news_content)
+        return news_content
+
+    def finish(i: int, news_url: str, news_content: Optional[List[Dict[str, Any]]]) -> Optional[List[Dict[str, Any]]]:
+        print(f"第 {i}/{len(news_links)} 条新闻: {news_url}")
+        if not news_content:
+            print("× 提取失败")
+            return None
+        # 缓存中保存的是 LLM 原始抽取结果，每次产出前按当前的证券主数据校验；缺字段的记录在写入检查点前丢弃
+        news_content = with_news_url(news_url, valid_records(resolve_entities(valid_records(news_content, content_schema))))
+        if not news_content:
+            # 没有需要分析的记录，直接标记为已处理；其余文章在因子结果保存后才标记
+            seen_store.mark_seen(news_url, news_content)
+            print("× 未识别到涉及的上市公司")
+            return None
+        print("√ 提取成功")
+        print(news_content)
+        return news_content
+
+    print(f"并发数: {CRAWL_MAX_WORKERS}, 单站点并发上限: {CRAWL_PER_HOST_LIMIT}")
+    try:
+        done = 0
+        async for news_url, news_content in iter_fetch(news_links, fetch_news_content, CRAWL_MAX_WORKERS, CRAWL_PER_HOST_LIMIT, limiter, fetch_takes_slot=True):
+            if news_url in pending:
+                continue
+            done += 1
+            news_content = finish(done, news_url, news_content)
+            if news_content:
+                yield news_url, news_content
+
+        if pending:
+            llm_config = get_llm_clients().llm_config("deepseek")
+            batch_results = await batch_extract(
+                [(news_url, body) for news_url, (_, body) in pending.items()],
+                content_instruction,
+                content_schema,
+                provider=llm_config.provider,
+                api_token=llm_config.api_token,
+                api_base=llm_config.base_url,
+                guard=get_llm_clients().guard("deepseek"),
             )
-            
-            if content_result.success and content_result.extracted_content:
-                news_content = json.loads(content_result.extracted_content) if isinstance(content_result.extracted_content, str) else content_result.extracted_content
-
-                if isinstance(news_content, list):
-                    all_news.extend(news_content)
-                else:
-                    all_news.append(news_content)
-                print("√ 提取成功")
-                print(news_content)
-            else:
-                print("× 提取失败")
+            for news_url, news_content in batch_results.items():
+                if news_content:
+                    extraction_cache.put(news_url, pending[news_url][0], content_schema_key, news_content)
+                done += 1
+                news_content = finish(done, news_url, news_content)
+                if news_content:
+                    yield news_url, news_content
+        print(f"抽取缓存命中 {extraction_cache.hits} 次, 未命中 {extraction_cache.misses} 次")
+        if get_security_master() is not None:
+            print(get_security_master().stats.report())
+        print(get_llm_clients().guard("deepseek").report())
+        if prune_stats["before"]:
+            print(f"页面裁剪共节省 {prune_stats['before'] - prune_stats['after']} tokens（{prune_stats['before']} → {prune_stats['after']}）")
+    finally:
+        extraction_cache.close()
+        seen_store.close()
 
-        
-        print(f"\n新闻处理完成:")
-        print(f"- 总链接数: {total_links}")
-        print(f"- 处理链接数: {len(news_links)}")
-        print(f"- 提取的公司记录数: {len(all_news)}")
-        
-        # Save raw news data
-        if all_news:
-            fieldnames = ['时间', '标题', '正文', '涉及公司', '股票代码', '股票简称']
-            field_mapping = {
-                'news_time': '时间',
-                'news_title': '标题',
-                'news_text': '正文',
-                'company_involved': '涉及公司',
-                'stock_code': '股票代码',
-                'stock_short_name': '股票简称'
-            }
-            try:
-                with open('news.csv', 'w', newline='', encoding='utf-8') as csvfile:
-                    writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                    writer.writeheader()
-                    for item in all_news:
-                        row = {field_mapping[k]: item.get(k, "") for k in field_mapping}
-                        writer.writerow(row)
-                print(f"- 原始新闻数据已保存到 news.csv")
-            except Exception as e:
-                print(f"保存CSV文件时出错: {str(e)}")
-                    
-        return all_news
+async def iter_sources_records(crawler: CrawlerPool, urls: List[str], stats: Optional[Dict[str, int]] = None, skip: Optional[set] = None) -> AsyncIterator[Tuple[str, List[Dict[str, Any]]]]:
+    """
+    并发抓取多个新闻列表页，按完成顺序合并产出 (文章 URL, 记录列表)。
+
+    同一篇文章出现在多个列表页时只抓取一次；skip 中的文章（如检查点中已完成的）不再抓取。
+    """
+    stats = stats if stats is not None else {}
+    stats.update(total_links=0, processed_links=0)
+    claimed: set = set(skip or ())
+    limiter = HostLimiter(CRAWL_MAX_WORKERS, CRAWL_PER_HOST_LIMIT)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, CRAWL_MAX_WORKERS))
+    done = object()
+
+    async def run_source(url: str):
+        source_stats: Dict[str, int] = {}
+        try:
+            async for item in iter_news_records(crawler, url, source_stats, claimed, limiter):
+                await queue.put(item)
+        except Exception as e:
+            print(f"抓取来源 {url} 时出错: {e}")
+        finally:
+            stats["total_links"] += source_stats.get("total_links", 0)
+            stats["processed_links"] += source_stats.get("processed_links", 0)
+            await queue.put(done)
+
+    tasks = [asyncio.create_task(run_source(url)) for url in urls]
+    try:
+        remaining = len(tasks)
+        while remaining:
+            item = await queue.get()
+            if item is done:
+                remaining -= 1
+                continue
+            yield item
+    finally:
+        for task in tasks:
+            task.cancel()
+
+def with_news_url(news_url: str, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """给记录带上来源文章 URL，因子结果保存后据此标记已处理"""
+    return [{"news_url": news_url, **record} for record in records]
+
+def unanalyzed_urls(news_data: List[Dict[str, Any]], factor_data: List[Dict[str, Any]]) -> Set[str]:
+    """有公司没有得到因子结果的文章 URL"""
+    produced = {(item["news_title"], item["stock_code"]) for item in factor_data}
+    return {news.get("news_url", "") for news in news_data if (news["news_title"], news["stock_code"]) not in produced} - {""}
+
+def mark_articles_seen(news_data: List[Dict[str, Any]], failed: Set[str], seen_store: Optional[SeenURLStore] = None) -> None:
+    """
+    因子结果已保存的文章标记为已处理。
+
+    标记放在保存之后：抽取完成但还在队列中、尚未分析保存的文章在进程退出后仍能从检查点恢复。
+    分析未完成（failed）的文章不标记，检查点也保持未完成，下次运行重新分析。
+    """
+    by_url: Dict[str, List[Dict[str, Any]]] = {}
+    for news in news_data:
+        if news.get("news_url") and news["news_url"] not in failed:
+            by_url.setdefault(news["news_url"], []).append(news)
+    store = seen_store if seen_store is not None else SeenURLStore()
+    try:
+        for url, records in by_url.items():
+            store.mark_seen(url, records)
+    finally:
+        if seen_store is None:
+            store.close()
+
+def give_up_failures(urls: List[str], news_data: List[Dict[str, Any]], failed: Set[str], seen_store: Optional[SeenURLStore] = None) -> Set[str]:
+    """
+    记下分析失败的文章，返回仍需下次重试的部分。
+
+    失败达到 ANALYZE_MAX_ATTEMPTS 次的文章标记为已处理（status=failed），不再重新分析，
+    检查点也不再因为它们保持未完成，避免每次运行都为同一篇文章重复付费调用 LLM。
+    """
+    exhausted = record_failures(urls, failed)
+    if not exhausted:
+        return failed
+    store = seen_store if seen_store is not None else SeenURLStore()
+    try:
+        for url in sorted(exhausted):
+            store.mark_seen(url, [news for news in news_data if news.get("news_url") == url], status="failed")
+            print(f"分析已失败 {ANALYZE_MAX_ATTEMPTS} 次，放弃: {url}")
+    finally:
+        if seen_store is None:
+            store.close()
+    return failed - exhausted
+
+def dedup_news_records(records: List[Dict[str, Any]], seen_keys: set) -> List[Dict[str, Any]]:
+    """按 (新闻标题, 股票代码) 去重，合并不同来源转载的同一条新闻"""
+    unique = []
+    for item in records:
+        key = (item.get("news_title", "").strip(), item.get("stock_code", "").strip())
+        if key in seen_keys:
+            continue
+        seen_keys.add(key)
+        unique.append(item)
+    return unique
 
+# Tools
 @tool
-def analyze_news_impact(input_data: NewsInput) -> List[Dict[str, Any]]:
-    """分析新闻对公司的影响"""
-    llm = ChatTongyi(model="qwen-plus",api_key=os.getenv("DASHSCOPE_API_KEY"))
+async def crawl_and_save_news(url: str, only_url: bool = False) -> List[Dict[str, Any]]:
+    """
+    使用 crawl4ai 从给定 URL 抓取新闻并提取内容，同时保存原始新闻数据。
     
-    factor_data = []
-    for news in input_data.news_data:
-        prompt = f"""
-        请分析以下新闻对公司的影响：
-        
-        新闻标题：{news['news_title']}
-        新闻正文：{news['news_text']}
-        涉及公司：{news['company_involved']}
-        
-        请提供：
-        1. 一句话新闻摘要
-        2. 影响方向评估：
-           - 输出+1表示正面影响
-           - 输出-1表示负面影响
-           - 输出0表示中性影响
-        
-        请严格按照以下JSON格式返回，不要包含任何其他内容：
-        {{"summary": "这里是新闻摘要", "impact": 影响方向数字}}
-        """
+    参数
+        url： 要抓取新闻的 URL。默认为 eastmoney quick news。
+        only_url： 为 True 时只抓取 url，不附带其余已启用的来源。
         
-        try:
-            response = llm.invoke(prompt)
-            # 从response.content中提取JSON字符串
-            content = response.content
-            # 查找JSON开始和结束的位置
-            start = content.find('{')
-            end = content.rfind('}') + 1
-            if start != -1 and end != -1:
-                json_str = content[start:end]
-                # 移除JSON中数字前的+号，因为这不是有效的JSON格式
-                json_str = json_str.replace('"+1"', '1').replace('"+0"', '0').replace('"+', '')
-                analysis = json.loads(json_str)
-                factor_data.append({
-                    "company_name": news["company_involved"],
-                    "stock_code": news["stock_code"],
-                    "stock_short_name": news["stock_short_name"],
-                    "news_time": news["news_time"],
-                    "news_title": news["news_title"],
-                    "impact_direction": analysis["impact"],
-                    "news_summary": analysis["summary"]
-                })
-                print(f"成功分析新闻: {news['news_title']}")
+    返回值
+        包含提取新闻内容的字典列表。
+    """
+    stats: Dict[str, int] = {}
+    all_news = []
+    seen_keys: set = set()
+    # 指定的列表页与其余已启用的来源一起并发抓取
+    urls = [url] if only_url else source_urls(url)
+    print(f"本次抓取 {len(urls)} 个来源: {urls}")
+
+    # 每篇文章完成后写入检查点；上次运行中途退出时从检查点继续
+    checkpoint = CrawlCheckpoint.open(urls)
+    # 原始新闻每篇抽取完成后立即追加保存（检查点恢复的新闻已写入过的会被去重跳过）
+    news_store = RecordStore("news.csv", NEWS_FIELD_MAPPING)
+    resumed = checkpoint.completed()
+    if resumed:
+        print(f"从检查点 {checkpoint.run_id} 恢复: 已完成 {len(resumed)} 篇新闻")
+        for news_url, news_content in resumed.items():
+            news_content = dedup_news_records(with_news_url(news_url, valid_records(news_content)), seen_keys)
+            news_store.append(news_content)
+            all_news.extend(news_content)
+
+    # 使用常驻浏览器池，避免每次运行都重新启动浏览器
+    crawler = await get_crawler_pool()
+    try:
+        async for news_url, news_content in iter_sources_records(crawler, urls, stats, skip=set(resumed)):
+            checkpoint.save_article(news_url, news_content)
+            news_content = dedup_news_records(news_content, seen_keys)
+            news_store.append(news_content)
+            all_news.extend(news_content)
+    finally:
+        checkpoint.close()
+        news_store.close()
+    print(crawler.stats())
+
+    if not stats["processed_links"] and not all_news:
+        return []
+
+    print(f"\n新闻处理完成:")
+    print(f"- 总链接数: {stats['total_links']}")
+    print(f"- 处理链接数: {stats['processed_links']}")
+    print(f"- 从检查点恢复: {len(resumed)}")
+    print(f"- 提取的公司记录数: {len(all_news)}")
+    print(f"- 原始新闻新增保存 {news_store.count} 条，已保存过跳过 {news_store.duplicates} 条")
+
+    return all_news
+
+def group_news_by_article(news_data: List[Dict[str, Any]]) -> List[List[int]]:
+    """按文章（标题 + 正文）把公司记录分组，返回每篇文章对应的记录下标，按首次出现的顺序排列"""
+    groups: Dict[str, List[int]] = {}
+    for i, news in enumerate(news_data):
+        groups.setdefault(article_key(news), []).append(i)
+    return list(groups.values())
+
+def impact_record(news: Dict[str, Any], analysis: CompanyImpact, source: str = "llm") -> Dict[str, Any]:
+    """把一家公司的分析结果展开成 NewsImpact 行"""
+    return NewsImpact(
+        company_name=news["company_involved"],
+        stock_code=news["stock_code"],
+        stock_short_name=news["stock_short_name"],
+        news_time=news["news_time"],
+        news_title=news["news_title"],
+        impact_direction=analysis.impact_direction,
+        news_summary=analysis.news_summary,
+        source=source,
+    ).model_dump()
+
+def article_prompt(records: List[Dict[str, Any]]) -> str:
+    news = records[0]
+    companies = "\n".join(
+        f"    - {r['company_involved']}（{r['stock_short_name']}，{r['stock_code']}）" for r in records
+    )
+    prompt = f"""
+    请分析以下新闻对每一家涉及公司的影响：
+    
+    新闻标题：{news['news_title']}
+    新闻正文：{truncate_to_tokens(news['news_text'], ANALYZE_LONG_TOKENS)}
+    涉及公司：
+{companies}
+    
+    请为每一家公司分别提供：
+    1. 一句话新闻摘要（侧重该公司）
+    2. 影响方向评估：
+       - 输出+1表示正面影响
+       - 输出-1表示负面影响
+       - 输出0表示中性影响
+    3. 对影响方向判断的把握程度（0到1之间）
+    """
+    if ANALYZE_STRUCTURED_OUTPUT:
+        return prompt + "\n    请调用 ArticleImpact 返回结果，每家公司一项。\n    "
+    return prompt + f"""
+    请严格按照以下JSON格式返回，每家公司一项，不要包含任何其他内容：
+    {ARTICLE_IMPACT_FORMAT}
+    """
+
+def parse_article_impact(content: str, schema: Type[BaseModel] = ArticleImpact) -> Tuple[Optional[BaseModel], str]:
+    """从文本中解析 ArticleImpact（或批量分析的 BatchImpact），返回 (结果, 错误信息)"""
+    start = content.find('{')
+    end = content.rfind('}') + 1
+    if start == -1 or end == 0:
+        return None, "响应中没有JSON"
+    try:
+        return schema.model_validate_json(content[start:end]), ""
+    except ValidationError as e:
+        return None, str(e)
+
+async def request_article_impact(llm: CachedLLM, prompt: str, schema: Type[BaseModel] = ArticleImpact) -> Tuple[Optional[BaseModel], str, str]:
+    """请求模型分析文章，返回 (结果, 原始输出, 错误信息)"""
+    guard = get_llm_clients().guard("dashscope")
+    if ANALYZE_STRUCTURED_OUTPUT:
+        structured = llm.llm.with_structured_output(schema, include_raw=True, method="function_calling")
+        output = await guard.call(lambda: structured.ainvoke(prompt))
+        if output["parsed"] is not None:
+            return output["parsed"], "", ""
+        raw = output["raw"]
+        tool_calls = getattr(raw, "tool_calls", None)
+        content = json.dumps(tool_calls[0]["args"], ensure_ascii=False) if tool_calls else raw.content
+    else:
+        content = (await guard.call(lambda: llm.llm.ainvoke(prompt))).content
+    article, error = parse_article_impact(content, schema)
+    return article, content, error
+
+async def repair_article_impact(llm: CachedLLM, content: str, error: str) -> Optional[ArticleImpact]:
+    """只把错误的输出和校验错误发给模型修正格式，不重复发送新闻正文"""
+    prompt = f"""
+    下面的输出不符合要求的JSON格式，请修正后只返回JSON，不要修改其中的内容。
+    
+    校验错误：{error[:500]}
+    要求格式：{ARTICLE_IMPACT_FORMAT}
+    原输出：{content}
+    """
+    response = await get_llm_clients().guard("dashscope").call(lambda: llm.llm.ainvoke(prompt))
+    return parse_article_impact(response.content)[0]
+
+def match_results(records: List[Dict[str, Any]], results: List[CompanyImpact]) -> List[Optional[CompanyImpact]]:
+    """
+    按证券代码把模型结果对应回公司记录：先按完整代码，再按 6 位数字（模型常省略 .SH 等后缀）。
+    只剩一条结果和一家公司对不上时才直接对应，多家时按顺序对应容易张冠李戴，留给补问。
+    """
+    matched: List[Optional[CompanyImpact]] = [None] * len(records)
+    unmatched = list(results)
+    for same in (lambda a, b: a.strip() == b.strip(), lambda a, b: code_digits(a) != "" and code_digits(a) == code_digits(b)):
+        for i, record in enumerate(records):
+            if matched[i] is not None:
+                continue
+            item = next((item for item in unmatched if same(item.stock_code, record["stock_code"])), None)
+            if item is not None:
+                matched[i] = item
+                unmatched.remove(item)
+    missing = [i for i, impact in enumerate(matched) if impact is None]
+    if len(missing) == 1 and len(unmatched) == 1:
+        matched[missing[0]] = unmatched[0]
+    return matched
+
+async def analyze_article(llm: CachedLLM, records: List[Dict[str, Any]], retry_missing: bool = True) -> Tuple[List[Optional[CompanyImpact]], int]:
+    """
+    一次分析一篇文章对其涉及的所有公司的影响。
+
+    records 是同一篇文章的公司记录，返回 (结果, 实际调用模型的次数)：结果与 records 一一对应，
+    分析失败的公司为 None；命中缓存时调用次数为 0。
+    响应不合法时先修正格式，模型漏掉的公司再单独补问一次。
+    """
+    news = records[0]
+    prompt = article_prompt(records)
+    calls = 0
+    try:
+        cached = llm.lookup(prompt)
+        if cached is not None:
+            article = ArticleImpact.model_validate_json(cached)
+        else:
+            calls += 1
+            article, content, error = await request_article_impact(llm, prompt)
+            if article is None and content:
+                print(f"分析结果格式不正确，尝试修正: {news['news_title']}（{error[:200]}）")
+                calls += 1
+                article = await repair_article_impact(llm, content, error)
+            if article is None:
+                print(f"无法解析分析结果: {news['news_title']}")
+                return [None] * len(records), calls
+            llm.store(prompt, article.model_dump_json())
+    except Exception as e:
+        print(f"分析新闻时出错: {news['news_title']}: {str(e)}")
+        return [None] * len(records), calls
+
+    impacts = match_results(records, article.results)
+    missing = [i for i, impact in enumerate(impacts) if impact is None]
+    if missing and retry_missing:
+        print(f"补充分析遗漏的 {len(missing)} 家公司: {news['news_title']}")
+        retried, retry_calls = await analyze_article(llm, [records[i] for i in missing], retry_missing=False)
+        calls += retry_calls
+        for i, impact in zip(missing, retried):
+            impacts[i] = impact
+    print(f"成功分析新闻: {news['news_title']}（{sum(i is not None for i in impacts)}/{len(records)} 家公司）")
+    return impacts, calls
+
+def is_short_article(records: List[Dict[str, Any]]) -> bool:
+    return estimate_tokens(records[0]["news_text"]) <= ANALYZE_SHORT_TOKENS
+
+def batch_prompt(batch: List[List[Dict[str, Any]]]) -> str:
+    parts = [f"""
+    请分别分析以下 {len(batch)} 篇新闻对各自涉及公司的影响。每篇新闻以“【新闻 编号】”开头。
+    
+    请为每篇新闻的每一家涉及公司分别提供：
+    1. 一句话新闻摘要（侧重该公司）
+    2. 影响方向评估：
+       - 输出+1表示正面影响
+       - 输出-1表示负面影响
+       - 输出0表示中性影响
+    3. 对影响方向判断的把握程度（0到1之间）
+    """]
+    for article_id, records in enumerate(batch, 1):
+        companies = "\n".join(f"    - {r['company_involved']}（{r['stock_short_name']}，{r['stock_code']}）" for r in records)
+        parts.append(f"""
+    【新闻 {article_id}】
+    新闻标题：{records[0]['news_title']}
+    新闻正文：{records[0]['news_text']}
+    涉及公司：
+{companies}
+    """)
+    if ANALYZE_STRUCTURED_OUTPUT:
+        parts.append("\n    请调用 BatchImpact 返回结果，每篇新闻一项，article_id 为新闻编号。\n    ")
+    else:
+        parts.append(f"""
+    请严格按照以下JSON格式返回，每篇新闻一项，不要包含任何其他内容：
+    {BATCH_IMPACT_FORMAT}
+    """)
+    return "".join(parts)
+
+async def analyze_batch(llm: CachedLLM, batch: List[List[Dict[str, Any]]]) -> List[Optional[List[Optional[CompanyImpact]]]]:
+    """
+    把多篇短讯放进一个请求分析。
+
+    返回值与 batch 一一对应；完整的结果按单篇 prompt 写入缓存，与单独分析共用缓存。
+    请求失败或缺少的新闻为 None，由调用方单独分析。
+    """
+    try:
+        result, _, error = await request_article_impact(llm, batch_prompt(batch), BatchImpact)
+    except Exception as e:
+        print(f"批量分析出错，{len(batch)} 篇新闻改为单独分析: {str(e)}")
+        return [None] * len(batch)
+    if result is None:
+        print(f"批量分析结果格式不正确，{len(batch)} 篇新闻改为单独分析: {error[:200]}")
+        return [None] * len(batch)
+
+    by_id = {item.article_id: item.results for item in result.articles}
+    outputs: List[Optional[List[Optional[CompanyImpact]]]] = []
+    for article_id, records in enumerate(batch, 1):
+        impacts = match_results(records, by_id.get(article_id, []))
+        if all(impact is not None for impact in impacts):
+            llm.store(article_prompt(records), ArticleImpact(results=impacts).model_dump_json())
+            outputs.append(impacts)
+        else:
+            outputs.append(None)
+    return outputs
+
+def lexicon_applies(records: List[Dict[str, Any]]) -> bool:
+    """
+    词典只给出标题级别的方向，只能用于只涉及一家公司的文章；标题还点名了其他证券时
+    （如“A拟减持B股份”）方向可能只针对其中一方，也交给 LLM。
+    """
+    if len(records) != 1:
+        return False
+    master = get_security_master()
+    if master is None:
+        return True
+    named = {security.digits for security in master.tag(records[0]["news_title"])}
+    return named <= {code_digits(records[0]["stock_code"])}
+
+def lexicon_impacts(records: List[Dict[str, Any]], label: int) -> List[Optional[CompanyImpact]]:
+    """词典直接判定的文章：以标题作为摘要"""
+    return [CompanyImpact(stock_code=r["stock_code"], news_summary=r["news_title"], impact_direction=label) for r in records]
+
+class CascadeStats:
+    """各模型层级的调用次数、累计耗时，以及升级到下一层级的文章数"""
+
+    def __init__(self):
+        self.calls: Dict[str, int] = {}
+        self.seconds: Dict[str, float] = {}
+        self.escalated = 0
+
+    def record(self, model: str, seconds: float, calls: int = 1) -> None:
+        """记录实际发给模型的请求；命中缓存的分析不计入"""
+        if calls <= 0:
+            return
+        self.calls[model] = self.calls.get(model, 0) + calls
+        self.seconds[model] = self.seconds.get(model, 0.0) + seconds
+
+    def report(self) -> str:
+        tiers = "，".join(
+            f"{model} {calls} 次（平均 {self.seconds[model] / calls:.1f} 秒）" for model, calls in self.calls.items()
+        )
+        return f"模型调用: {tiers or '无'}；升级 {self.escalated} 篇"
+
+def analysis_tiers() -> List[CachedLLM]:
+    """分析使用的模型层级：级联模式下先用便宜的模型，不满意时再升级到 qwen-plus"""
+    models = [ANALYZE_CASCADE_MODEL, "qwen-plus"] if ANALYZE_CASCADE else ["qwen-plus"]
+    clients = get_llm_clients()
+    return [CachedLLM(clients.chat_model(model), ANALYSIS_PROMPT_VERSION) for model in models]
+
+def needs_escalation(impacts: List[Optional[CompanyImpact]], signal: Optional[int]) -> bool:
+    """结果缺失、置信度低（包括模型没有给出置信度），或与词典信号方向不一致时需要升级"""
+    for impact in impacts:
+        if impact is None or (impact.confidence or 0) < ANALYZE_CASCADE_MIN_CONFIDENCE:
+            return True
+        if signal is not None and impact.impact_direction != signal:
+            return True
+    return False
+
+async def cascade_article(tiers: List[CachedLLM], records: List[Dict[str, Any]], signal: Optional[int], stats: CascadeStats, first: Optional[List[Optional[CompanyImpact]]] = None) -> List[Optional[CompanyImpact]]:
+    """
+    按层级依次分析一篇文章，满意即停止；最后一层的结果直接采用。
+
+    first 是第一层已经通过批量分析得到的结果；不完整时第一层再单独分析这篇文章。
+    """
+    impacts: List[Optional[CompanyImpact]] = [None] * len(records)
+    for level, llm in enumerate(tiers):
+        if level == 0 and first is not None and all(impact is not None for impact in first):
+            impacts = first
+        else:
+            started = time.perf_counter()
+            impacts, calls = await analyze_article(llm, records)
+            stats.record(llm.model, time.perf_counter() - started, calls)
+        if level == len(tiers) - 1 or not needs_escalation(impacts, signal):
+            break
+        stats.escalated += 1
+        print(f"升级到 {tiers[level + 1].model} 重新分析: {records[0]['news_title']}")
+    return impacts
+
+async def analyze_all_news(tiers: List[CachedLLM], news_data: List[Dict[str, Any]], concurrency: int = ANALYZE_CONCURRENCY, stats: Optional[LexiconStats] = None, cascade_stats: Optional[CascadeStats] = None) -> List[Optional[Dict[str, Any]]]:
+    """
+    按文章并发分析新闻，结果与输入记录一一对应。
+
+    实际同时发出的请求数由 DashScope 容错层的 AIMD 限制决定；concurrency > 0 时另外限制同时分析的文章数。
+
+    只涉及一家公司、词典预分类能以足够置信度判定的文章直接给出结果，不调用 LLM；判定情况记入 stats。
+    其余文章中，未命中缓存的短讯先按 token 预算打包做第一层分析，长文单独分析；
+    之后按 tiers 的顺序逐级分析，各层级的调用情况记入 cascade_stats。
+    """
+    semaphore = asyncio.Semaphore(concurrency if concurrency > 0 else max(1, len(news_data)))
+    groups = group_news_by_article(news_data)
+    lexicon = get_impact_lexicon()
+    stats = stats if stats is not None else LexiconStats()
+    cascade_stats = cascade_stats if cascade_stats is not None else CascadeStats()
+
+    impacts_by_group: Dict[int, List[Optional[CompanyImpact]]] = {}
+    # 词典判定的文章在因子数据中标记来源，校准词典时排除
+    lexicon_groups: Set[int] = set()
+    signals: Dict[int, Optional[int]] = {}
+    for g, indices in enumerate(groups):
+        title = news_data[indices[0]]["news_title"]
+        signals[g] = None
+        if lexicon is not None:
+            # 涉及多家公司（或标题点名其他证券）的文章各方向可能不同，词典的标题级判断既不直接采用，也不作为升级信号
+            if not lexicon_applies([news_data[i] for i in indices]):
+                stats.record(None)
+                continue
+            labeled = lexicon.classify(title)
+            stats.record(labeled[1] if labeled is not None else None)
+            if labeled is not None:
+                impacts_by_group[g] = lexicon_impacts([news_data[i] for i in indices], labeled[0])
+                lexicon_groups.add(g)
+                continue
+            # 未达到阈值的词典判断作为级联升级的参考信号
+            scored = lexicon.score(title)
+            signals[g] = scored[0] if scored is not None else None
+    remaining = [g for g in range(len(groups)) if g not in impacts_by_group]
+
+    # 第一层：短讯打包分析（已缓存的文章不参与打包）
+    first: Dict[int, List[Optional[CompanyImpact]]] = {}
+    if ANALYZE_BATCH_MAX_ITEMS > 1:
+        short = []
+        for g in remaining:
+            records = [news_data[i] for i in groups[g]]
+            if not is_short_article(records):
+                continue
+            cached = tiers[0].lookup(article_prompt(records))
+            if cached is not None:
+                first[g] = match_results(records, ArticleImpact.model_validate_json(cached).results)
             else:
-                print(f"无法从响应中提取JSON: {content}")
-        except Exception as e:
-            print(f"分析新闻时出错: {str(e)}")
-            print(f"错误的响应内容: {response.content if 'response' in locals() else 'No response'}")
-            continue
-            
+                short.append((str(g), records[0]["news_text"]))
+        batches = [b for b in pack_batches(short, ANALYZE_BATCH_TOKEN_BUDGET, ANALYZE_BATCH_MAX_ITEMS) if len(b) > 1]
+        if batches:
+            print(f"短讯打包分析: {sum(len(b) for b in batches)} 篇新闻打包为 {len(batches)} 个请求")
+
+        async def analyze_packed(batch: List[Tuple[str, str]]) -> None:
+            members = [int(g) for g, _ in batch]
+            async with semaphore:
+                started = time.perf_counter()
+                outputs = await analyze_batch(tiers[0], [[news_data[i] for i in groups[g]] for g in members])
+                cascade_stats.record(tiers[0].model, time.perf_counter() - started)
+            for g, impacts in zip(members, outputs):
+                if impacts is not None:
+                    first[g] = impacts
+
+        await asyncio.gather(*(analyze_packed(b) for b in batches))
+
+    async def analyze(g: int) -> None:
+        async with semaphore:
+            impacts_by_group[g] = await cascade_article(tiers, [news_data[i] for i in groups[g]], signals[g], cascade_stats, first.get(g))
+
+    await asyncio.gather(*(analyze(g) for g in remaining))
+
+    results: List[Optional[Dict[str, Any]]] = [None] * len(news_data)
+    for g, indices in enumerate(groups):
+        for i, impact in zip(indices, impacts_by_group[g]):
+            source = SOURCE_LEXICON if g in lexicon_groups else "llm"
+            results[i] = impact_record(news_data[i], impact, source) if impact is not None else None
+    print(f"按文章分析: {len(news_data)} 条公司记录合并为 {len(groups)} 篇文章")
+    return results
+
+@tool
+async def analyze_news_impact(input_data: NewsInput) -> List[Dict[str, Any]]:
+    """分析新闻对公司的影响"""
+    tiers = analysis_tiers()
+    
+    stats = LexiconStats()
+    cascade_stats = CascadeStats()
+    results = await analyze_all_news(tiers, input_data.news_data, stats=stats, cascade_stats=cascade_stats)
+    factor_data = [impact for impact in results if impact is not None]
+    print(f"新闻分析完成: {len(factor_data)}/{len(results)} 条成功")
+    print(stats.report())
+    print(cascade_stats.report())
+    print(get_llm_clients().guard("dashscope").report())
+    if tiers[0].cache is not None:
+        print(tiers[0].cache.stats())
     return factor_data
 
 class SaveInput(BaseModel):
@@ -247,27 +990,15 @@ def save_factor_data(input_data: SaveInput) -> str:
     if not input_data.data:
         return "No data to save"
 
-    fieldnames = ['公司名', '股票代码', '股票简称', '新闻时间', '新闻标题', '影响方向', '新闻摘要']
-    field_mapping = {
-        'company_name': '公司名',
-        'stock_code': '股票代码',
-        'stock_short_name': '股票简称',
-        'news_time': '新闻时间',
-        'news_title': '新闻标题',
-        'impact_direction': '影响方向',
-        'news_summary': '新闻摘要'
-    }
-    
+    # 只追加并按日期分文件，不覆盖历史因子数据
+    store = RecordStore(input_data.filename, FACTOR_FIELD_MAPPING)
     try:
-        with open(input_data.filename, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            for item in input_data.data:
-                row = {field_mapping[k]: item[k] for k in field_mapping}
-                writer.writerow(row)
-        return f"Successfully saved {len(input_data.data)} records to {input_data.filename}"
+        saved = store.append(input_data.data)
+        return f"Successfully saved {saved} records to {input_data.filename} ({store.duplicates} duplicates skipped)"
     except Exception as e:
         return f"Error saving to CSV: {str(e)}"
+    finally:
+        store.close()
 
 @tool
 def get_news_url(input_data: URLInput) -> str:
@@ -278,32 +1009,172 @@ def get_news_url(input_data: URLInput) -> str:
     # 否则返回默认URL
     return "https://kuaixun.eastmoney.com/ssgs.html"
 
+def state_urls(state: AgentState) -> List[str]:
+    """本次运行抓取的列表页，与 crawl_and_save_news 的取法一致"""
+    return [state["url"]] if state.get("only_url") else source_urls(state["url"])
+
 # 节点函数
 async def crawl_node(state: AgentState) -> AgentState:
     """新闻爬取节点"""
-    url = state["url"]
-    news_data = await crawl_and_save_news.ainvoke(url)
+    news_data = await crawl_and_save_news.ainvoke({"url": state["url"], "only_url": state.get("only_url", False)})
     state["news_data"] = news_data
     return state
 
 async def analyze_node(state: AgentState) -> AgentState:
     """新闻分析节点"""
-    news_input = NewsInput(news_data=state["news_data"])
+    news_data = state["news_data"]
+    # 同一条新闻的转载/重复推送只分析一次
+    if NEAR_DUP_ENABLED:
+        news_data = collapse_near_duplicates(news_data)
+    # 只分析股票池内的公司，LLM 调用量随股票池而不是全市场新闻量增长
+    universe = get_universe()
+    if universe is not None:
+        universe_stats = UniverseStats()
+        news_data = universe.filter(news_data, universe_stats)
+        print(universe_stats.report())
+    news_input = NewsInput(news_data=news_data)
     factor_data = await analyze_news_impact.ainvoke({"input_data": news_input.model_dump()})
     state["factor_data"] = factor_data
+    state["failed_urls"] = sorted(unanalyzed_urls(news_data, factor_data))
     print("analyze_node")
     return state
 
 async def save_node(state: AgentState) -> AgentState:
     """数据保存节点"""
     input_data = SaveInput(data=state["factor_data"])
-    await save_factor_data.ainvoke({"input_data": input_data.model_dump()})
+    result = await save_factor_data.ainvoke({"input_data": input_data.model_dump()})
+    failed = set(state.get("failed_urls") or [])
+    if result.startswith("Error"):
+        print(result)
+        failed = {news.get("news_url", "") for news in state["news_data"]} - {""}
+    else:
+        # 只有分析失败计入重试次数，保存失败（磁盘等问题）不计
+        failed = give_up_failures(state_urls(state), state["news_data"], failed)
+    mark_articles_seen(state["news_data"], failed)
+    if failed:
+        print(f"{len(failed)} 篇新闻分析未完成，保留检查点，下次运行重新分析")
+    else:
+        # 结果已全部落盘，本次抓取的检查点可以结束
+        finish_runs(state_urls(state))
     print("save_node")
     return state
 
+async def stream_node(state: AgentState) -> AgentState:
+    """流式节点：每篇新闻抽取完成后立即分析并保存，不等待整页抓取结束"""
+    # 有界队列提供背压：分析跟不上时抓取会暂停，内存占用不随新闻数量增长
+    queue: asyncio.Queue = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+
+    urls = state_urls(state)
+
+    async def produce():
+        checkpoint = CrawlCheckpoint.open(urls)
+        try:
+            seen_keys: set = set()
+            # 先处理检查点中上次已抽取但可能未分析完的新闻
+            resumed = checkpoint.completed()
+            if resumed:
+                print(f"从检查点 {checkpoint.run_id} 恢复: 已完成 {len(resumed)} 篇新闻")
+            for news_url, news_content in resumed.items():
+                news_content = dedup_news_records(with_news_url(news_url, valid_records(news_content)), seen_keys)
+                if news_content:
+                    await queue.put(news_content)
+
+            crawler = await get_crawler_pool()
+            async for news_url, news_content in iter_sources_records(crawler, urls, skip=set(resumed)):
+                checkpoint.save_article(news_url, news_content)
+                news_content = dedup_news_records(news_content, seen_keys)
+                if news_content:
+                    await queue.put(news_content)
+        finally:
+            checkpoint.close()
+            await queue.put(None)
+
+    async def take_batch() -> Optional[List[List[Dict[str, Any]]]]:
+        """等待一篇文章，再顺带取走队列中已经就绪的文章；抓取结束时返回 None"""
+        first = await queue.get()
+        if first is None:
+            # 把结束标记放回去，通知其他消费者
+            queue.put_nowait(None)
+            return None
+        batch = [first]
+        while len(batch) < STREAM_ANALYZE_BATCH:
+            try:
+                item = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+            if item is None:
+                queue.put_nowait(None)
+                break
+            batch.append(item)
+        return batch
+
+    async def consume():
+        while (batch := await take_batch()) is not None:
+            crawled = [news for news_content in batch for news in news_content]
+            news_data = crawled
+            if near_dup_index is not None:
+                news_data = collapse_near_duplicates(news_data, near_dup_index)
+            news_writer.append(news_data)
+            if universe is not None:
+                news_data = universe.filter(news_data, universe_stats)
+            if news_data:
+                # 同一篇文章涉及的多家公司在一次调用中分析，同一批中的短讯打包分析
+                results = await analyze_all_news(tiers, news_data, stats=lexicon_stats, cascade_stats=cascade_stats)
+                factor_data = [impact for impact in results if impact is not None]
+                factor_writer.append(factor_data)
+                failed.update(unanalyzed_urls(news_data, factor_data))
+            failed_news.extend(news for news in crawled if news.get("news_url") in failed)
+            mark_articles_seen(crawled, failed, seen_store)
+
+    producer = asyncio.create_task(produce())
+    tiers = analysis_tiers()
+    news_writer = RecordStore("news.csv", NEWS_FIELD_MAPPING)
+    factor_writer = RecordStore("factor.csv", FACTOR_FIELD_MAPPING)
+    near_dup_index = NearDupIndex() if NEAR_DUP_ENABLED else None
+    universe = get_universe()
+    universe_stats = UniverseStats()
+    lexicon_stats = LexiconStats()
+    cascade_stats = CascadeStats()
+    failed: Set[str] = set()
+    failed_news: List[Dict[str, Any]] = []
+    seen_store = SeenURLStore()
+    consumers = [asyncio.create_task(consume()) for _ in range(max(1, STREAM_ANALYZE_WORKERS))]
+    try:
+        await asyncio.gather(*consumers)
+        await producer
+    finally:
+        producer.cancel()
+        for consumer in consumers:
+            consumer.cancel()
+        if near_dup_index is not None:
+            near_dup_index.close()
+        news_writer.close()
+        factor_writer.close()
+        seen_store.close()
+
+    failed = give_up_failures(urls, failed_news, failed)
+    if failed:
+        print(f"{len(failed)} 篇新闻分析未完成，保留检查点，下次运行重新分析")
+    else:
+        finish_runs(urls)
+    print(f"流式处理完成: 新闻记录 {news_writer.count} 条, 因子记录 {factor_writer.count} 条")
+    if universe is not None:
+        print(universe_stats.report())
+    print(lexicon_stats.report())
+    print(cascade_stats.report())
+    print(get_llm_clients().guard("dashscope").report())
+    if tiers[0].cache is not None:
+        print(tiers[0].cache.stats())
+    return state
+
+def route_after_url(state: AgentState) -> str:
+    """根据 PIPELINE_STREAM_MODE 选择流式或分阶段处理"""
+    return "stream" if PIPELINE_STREAM_MODE else "crawl"
+
 async def get_url_node(state: AgentState) -> AgentState:
     """URL获取节点"""
-    url_input = URLInput(user_query="我需要最新的上市公司相关新闻")
+    # 调用方（对话或轮询守护进程）已经指定 URL 时直接使用
+    url_input = URLInput(user_query=state.get("url") or "我需要最新的上市公司相关新闻")
     url = await get_news_url.ainvoke({"input_data": url_input.model_dump()})
     state["url"] = url
     print(f"Selected URL based on user query: {url}")
@@ -319,12 +1190,14 @@ workflow.add_node("get_url", get_url_node)
 workflow.add_node("crawl", crawl_node)
 workflow.add_node("analyze", analyze_node)
 workflow.add_node("save", save_node)
+workflow.add_node("stream", stream_node)
 
 # 添加边
-workflow.add_edge("get_url", "crawl")
+workflow.add_conditional_edges("get_url", route_after_url, {"stream": "stream", "crawl": "crawl"})
 workflow.add_edge("crawl", "analyze")
 workflow.add_edge("analyze", "save")
 workflow.add_edge("save", END)
+workflow.add_edge("stream", END)
 
 # 设置入口
 workflow.set_entry_point("get_url")
@@ -334,14 +1207,15 @@ chain = workflow.compile()
 
 # 运行工作流
 async def run_workflow(user_query: str="我想了解金融财经的最新新闻"):
-    # 初始化对话模型
-    llm = ChatTongyi(model="qwen-plus", api_key=os.getenv("DASHSCOPE_API_KEY"))
+    # 初始化对话模型（相同的对话历史直接复用缓存的回答）
+    llm = CachedLLM(get_llm_clients().chat_model("qwen-plus"), CHAT_PROMPT_VERSION)
     
     # 初始化对话历史
     conversation_history = []
-    system_prompt = SystemMessage(content="""
+    source_list = "\n".join(f"    {i}. {source.listing_url} ({source.description})" for i, source in enumerate(SOURCES.values(), 1))
+    system_prompt = SystemMessage(content=f"""
     你是一个专业的金融新闻助手。当用户询问新闻时，请从以下URL中选择最合适的推荐给用户：
-    1. https://kuaixun.eastmoney.com/ssgs.html (东方财富上市公司快讯)
+{source_list}
 
     
     请直接在回答中包含选择的URL。对于其他问题，请正常回答。
@@ -377,7 +1251,9 @@ async def run_workflow(user_query: str="我想了解金融财经的最新新闻"
                     "messages": [],
                     "news_data": [],
                     "factor_data": [],
-                    "url": urls[0]  # 使用检测到的第一个URL
+                    "failed_urls": [],
+                    "url": urls[0],  # 使用检测到的第一个URL
+                    "only_url": False
                 }
                 
                 try:
@@ -386,6 +1262,10 @@ async def run_workflow(user_query: str="我想了解金融财经的最新新闻"
                 except Exception as e:
                     print(f"\n❌ 任务执行失败：{str(e)}")
                     
+    await close_crawler_pool()
+    await close_http_fetcher()
+    await close_llm_clients()
+    close_llm_cache()
     print("\n感谢使用金融新闻助手！再见！")
 
 if __name__ == "__main__":
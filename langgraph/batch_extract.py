@@ -0,0 +1,159 @@
+import os
+import json
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+import litellm
+from pydantic import BaseModel, ValidationError
+from page_pruner import estimate_tokens
+from llm_resilience import ProviderGuard
+
+# 批量抽取配置：单次请求的正文 token 预算 / 单次请求最多包含的文章数
+EXTRACT_BATCH_TOKEN_BUDGET = int(os.getenv("EXTRACT_BATCH_TOKEN_BUDGET", "6000"))
+EXTRACT_BATCH_MAX_ITEMS = int(os.getenv("EXTRACT_BATCH_MAX_ITEMS", "8"))
+# 没有容错层时同时进行的批量请求数；有容错层时由其 AIMD 限制控制并发
+EXTRACT_BATCH_CONCURRENCY = int(os.getenv("EXTRACT_BATCH_CONCURRENCY", "4"))
+
+def pack_batches(
+    articles: List[Tuple[str, str]],
+    token_budget: int = EXTRACT_BATCH_TOKEN_BUDGET,
+    max_items: int = EXTRACT_BATCH_MAX_ITEMS,
+) -> List[List[Tuple[str, str]]]:
+    """按 token 预算把 (url, 正文) 依次装入批次，单篇超出预算的文章单独成批"""
+    batches, current, used = [], [], 0
+    for url, text in articles:
+        tokens = estimate_tokens(text)
+        if current and (used + tokens > token_budget or len(current) >= max_items):
+            batches.append(current)
+            current, used = [], 0
+        current.append((url, text))
+        used += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _build_prompt(batch: List[Tuple[str, str]], instruction: str, schema: Dict[str, Any]) -> str:
+    parts = [
+        f"下面共有 {len(batch)} 篇新闻页面内容，每篇以“=== 文章 编号 ===”开头。",
+        "请对每一篇文章分别按照以下要求提取信息：",
+        instruction,
+        f"单条记录的 JSON Schema：{json.dumps(schema, ensure_ascii=False)}",
+        '请只返回一个 JSON 对象，键为文章编号（字符串），值为该文章的记录数组，例如 {"1": [...], "2": [...]}。',
+    ]
+    for i, (_, text) in enumerate(batch, 1):
+        parts.append(f"=== 文章 {i} ===\n{text}")
+    return "\n\n".join(parts)
+
+
+def parse_batch_response(
+    content: str, size: int, schema_model: Type[BaseModel]
+) -> Dict[int, Optional[List[Dict[str, Any]]]]:
+    """把批量响应拆回每篇文章的记录列表，缺失或校验失败的文章对应 None"""
+    parsed: Dict[int, Optional[List[Dict[str, Any]]]] = {i: None for i in range(1, size + 1)}
+    start, end = content.find("{"), content.rfind("}") + 1
+    if start == -1 or end == 0:
+        return parsed
+    try:
+        data = json.loads(content[start:end])
+    except json.JSONDecodeError:
+        return parsed
+    if not isinstance(data, dict):
+        return parsed
+
+    for i in parsed:
+        records = data.get(str(i))
+        if isinstance(records, dict):
+            records = [records]
+        if not isinstance(records, list) or not records:
+            continue
+        try:
+            parsed[i] = [schema_model(**r).model_dump() for r in records]
+        except (TypeError, ValidationError):
+            continue
+    return parsed
+
+
+async def _extract_one_batch(
+    batch: List[Tuple[str, str]],
+    instruction: str,
+    schema_model: Type[BaseModel],
+    provider: str,
+    api_token: Optional[str],
+    guard: Optional[ProviderGuard] = None,
+    api_base: Optional[str] = None,
+) -> Dict[str, Optional[List[Dict[str, Any]]]]:
+    prompt = _build_prompt(batch, instruction, schema_model.model_json_schema())
+
+    def request():
+        return litellm.acompletion(
+            model=provider,
+            messages=[{"role": "user", "content": prompt}],
+            api_key=api_token,
+            api_base=api_base,
+            temperature=0,
+        )
+
+    try:
+        response = await (guard.call(request) if guard is not None else request())
+        content = response.choices[0].message.content or ""
+    except Exception as e:
+        print(f"批量抽取请求出错: {e}")
+        return {url: None for url, _ in batch}
+
+    parsed = parse_batch_response(content, len(batch), schema_model)
+    return {url: parsed[i] for i, (url, _) in enumerate(batch, 1)}
+
+
+async def batch_extract(
+    articles: List[Tuple[str, str]],
+    instruction: str,
+    schema_model: Type[BaseModel],
+    provider: str = "deepseek/deepseek-chat",
+    api_token: Optional[str] = None,
+    token_budget: int = EXTRACT_BATCH_TOKEN_BUDGET,
+    max_items: int = EXTRACT_BATCH_MAX_ITEMS,
+    max_concurrency: int = EXTRACT_BATCH_CONCURRENCY,
+    guard: Optional[ProviderGuard] = None,
+    api_base: Optional[str] = None,
+) -> Dict[str, Optional[List[Dict[str, Any]]]]:
+    """
+    将多篇已清洗的文章正文打包成少量 LLM 请求进行结构化抽取。
+
+    参数
+        articles： (url, 正文) 列表。
+        instruction： 单篇文章的抽取指令，每批只发送一次。
+        schema_model： 单条记录的 pydantic 模型，用于生成 schema 和校验结果。
+        token_budget： 每批正文的 token 预算。
+        max_items： 每批最多包含的文章数。
+        max_concurrency： 没有 guard 时同时进行的批量请求数。
+        guard： 可选，供应商容错层（重试、熔断、AIMD 并发限制）。
+        api_base： 可选，供应商接口地址，与单篇抽取使用同一配置（如 DEEPSEEK_BASE_URL）。
+
+    返回值
+        url -> 记录列表 的字典；批量结果缺失的文章会单独重试一次，仍失败则为 None。
+    """
+    batches = pack_batches(articles, token_budget, max_items)
+    print(f"批量抽取: {len(articles)} 篇文章打包为 {len(batches)} 个请求")
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def _run(batch):
+        if guard is not None:
+            # 并发由容错层的 AIMD 限制控制，不再叠加固定上限
+            return await _extract_one_batch(batch, instruction, schema_model, provider, api_token, guard, api_base)
+        async with semaphore:
+            return await _extract_one_batch(batch, instruction, schema_model, provider, api_token, guard, api_base)
+
+    results: Dict[str, Optional[List[Dict[str, Any]]]] = {}
+    for part in await asyncio.gather(*(_run(b) for b in batches)):
+        results.update(part)
+
+    # 批量结果中缺失的文章逐篇重试（单篇批次已经是单独请求，不再重复）
+    bodies = dict(articles)
+    batch_size = {url: len(batch) for batch in batches for url, _ in batch}
+    retry = [url for url, records in results.items() if records is None and batch_size[url] > 1]
+    if retry:
+        print(f"批量抽取失败 {len(retry)} 篇，逐篇重试")
+        for part in await asyncio.gather(*(_run([(url, bodies[url])]) for url in retry)):
+            results.update(part)
+    return results
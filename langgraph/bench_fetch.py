@@ -0,0 +1,50 @@
+import sys
+import time
+import asyncio
+from typing import Any, Awaitable, Callable, List
+
+from crawl4ai import CrawlerRunConfig, CacheMode
+from browser_pool import CrawlerPool
+from concurrent_fetch import fetch_all, CRAWL_MAX_WORKERS, CRAWL_PER_HOST_LIMIT
+from http_fetch import fetch_via_http, fetch_via_browser, close_http_fetcher
+from link_extractor import extract_article_links
+
+# 用法: python bench_fetch.py [文章URL ...]
+# 不传 URL 时从东方财富快讯列表页按规则提取文章链接作为样本
+LISTING_URL = "https://kuaixun.eastmoney.com/ssgs.html"
+SAMPLE_SIZE = 20
+
+
+async def sample_urls(crawler: CrawlerPool) -> List[str]:
+    result = await crawler.arun(
+        url=LISTING_URL,
+        config=CrawlerRunConfig(word_count_threshold=1, cache_mode=CacheMode.BYPASS),
+    )
+    return extract_article_links(result, LISTING_URL)[:SAMPLE_SIZE] if result.success else []
+
+
+async def bench(name: str, urls: List[str], fetch_one: Callable[[str], Awaitable[Any]]) -> None:
+    start = time.perf_counter()
+    results = await fetch_all(urls, fetch_one, CRAWL_MAX_WORKERS, CRAWL_PER_HOST_LIMIT)
+    elapsed = time.perf_counter() - start
+    ok = sum(1 for _, r in results if r is not None and r.success)
+    print(f"{name:<8} 页面数 {len(urls):>3}  成功 {ok:>3}  耗时 {elapsed:6.2f}s  {len(urls) / elapsed:6.2f} 页/秒")
+
+
+async def main():
+    crawler = await CrawlerPool().start()
+    try:
+        urls = sys.argv[1:] or await sample_urls(crawler)
+        if not urls:
+            print("没有可用于测试的文章链接")
+            return
+        print(f"并发数: {CRAWL_MAX_WORKERS}, 单站点并发上限: {CRAWL_PER_HOST_LIMIT}\n")
+        await bench("浏览器", urls, lambda url: fetch_via_browser(crawler, url))
+        await bench("HTTP", urls, lambda url: fetch_via_http(crawler, url))
+    finally:
+        await crawler.close()
+        await close_http_fetcher()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,133 @@
+import os
+import asyncio
+from typing import Any, List, Optional
+
+from crawl4ai import AsyncWebCrawler
+
+# 浏览器池配置：常驻浏览器数量 / 每个浏览器处理多少个页面后回收 / 连续失败多少次视为不健康
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "2"))
+BROWSER_RECYCLE_PAGES = int(os.getenv("BROWSER_RECYCLE_PAGES", "200"))
+BROWSER_MAX_FAILURES = int(os.getenv("BROWSER_MAX_FAILURES", "3"))
+
+
+class _PooledCrawler:
+    def __init__(self, crawler: AsyncWebCrawler):
+        self.crawler = crawler
+        self.pages = 0
+        self.in_flight = 0
+        self.failures = 0
+        self.retiring = False
+
+
+class CrawlerPool:
+    """
+    跨工作流复用的 AsyncWebCrawler 池。
+
+    提供与 AsyncWebCrawler.arun 相同的调用方式，可直接替代 crawler 传给抓取函数。
+    每次调用分配给当前并发最少的浏览器；浏览器处理满 recycle_after 个页面或连续失败
+    max_failures 次后不再分配新任务，等手上的页面完成后关闭并由新浏览器替换。
+    """
+
+    def __init__(
+        self,
+        size: int = BROWSER_POOL_SIZE,
+        recycle_after: int = BROWSER_RECYCLE_PAGES,
+        max_failures: int = BROWSER_MAX_FAILURES,
+        **crawler_kwargs: Any,
+    ):
+        self.size = max(1, size)
+        self.recycle_after = recycle_after
+        self.max_failures = max_failures
+        self.crawler_kwargs = crawler_kwargs
+        self.members: List[_PooledCrawler] = []
+        self.started = 0
+        self.recycled = 0
+        self._lock = asyncio.Lock()
+        self.loop = asyncio.get_running_loop()
+
+    async def _spawn(self) -> _PooledCrawler:
+        crawler = AsyncWebCrawler(**self.crawler_kwargs)
+        await crawler.start()
+        self.started += 1
+        return _PooledCrawler(crawler)
+
+    def _healthy(self, member: _PooledCrawler) -> bool:
+        return getattr(member.crawler, "ready", True) and member.failures < self.max_failures
+
+    async def _retire(self, member: _PooledCrawler) -> None:
+        # 已被 _pick 或另一个请求回收的浏览器不再重复关闭
+        if member not in self.members:
+            return
+        self.members.remove(member)
+        self.recycled += 1
+        try:
+            await member.crawler.close()
+        except Exception as e:
+            print(f"关闭浏览器时出错: {e}")
+
+    async def _pick(self) -> _PooledCrawler:
+        async with self._lock:
+            for member in list(self.members):
+                if not self._healthy(member):
+                    member.retiring = True
+                if member.retiring and member.in_flight == 0:
+                    await self._retire(member)
+            active = [m for m in self.members if not m.retiring]
+            while len(active) < self.size:
+                member = await self._spawn()
+                self.members.append(member)
+                active.append(member)
+            return min(active, key=lambda m: m.in_flight)
+
+    async def start(self) -> "CrawlerPool":
+        """预热浏览器，避免第一次抓取时等待启动"""
+        await self._pick()
+        return self
+
+    async def arun(self, url: str, config: Any = None, **kwargs: Any) -> Any:
+        member = await self._pick()
+        member.in_flight += 1
+        try:
+            result = await member.crawler.arun(url=url, config=config, **kwargs)
+            member.failures = 0 if getattr(result, "success", True) else member.failures + 1
+            return result
+        except Exception:
+            member.failures += 1
+            raise
+        finally:
+            member.in_flight -= 1
+            # raw: 内容不经过浏览器渲染，不计入页面数
+            if not url.startswith("raw:"):
+                member.pages += 1
+            if member.pages >= self.recycle_after or not self._healthy(member):
+                member.retiring = True
+            if member.retiring and member.in_flight == 0:
+                async with self._lock:
+                    await self._retire(member)
+
+    async def close(self) -> None:
+        async with self._lock:
+            for member in list(self.members):
+                await self._retire(member)
+
+    def stats(self) -> str:
+        pages = sum(m.pages for m in self.members)
+        return f"浏览器池: 活跃 {len(self.members)} 个, 累计启动 {self.started} 个, 回收 {self.recycled} 个, 当前浏览器已处理页面 {pages} 个"
+
+
+_pool: Optional[CrawlerPool] = None
+
+
+async def get_crawler_pool() -> CrawlerPool:
+    """获取进程内共享的浏览器池，首次调用时启动"""
+    global _pool
+    if _pool is None or _pool.loop is not asyncio.get_running_loop():
+        _pool = await CrawlerPool().start()
+    return _pool
+
+
+async def close_crawler_pool() -> None:
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
@@ -0,0 +1,114 @@
+import os
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+# 并发抓取配置：总并发数 / 单个站点的并发上限
+CRAWL_MAX_WORKERS = int(os.getenv("CRAWL_MAX_WORKERS", "8"))
+CRAWL_PER_HOST_LIMIT = int(os.getenv("CRAWL_PER_HOST_LIMIT", "4"))
+# 同时处理中的文章数上限（包括抓取之后的 LLM 抽取），LLM 并发由供应商容错层的 AIMD 限制控制
+CRAWL_MAX_INFLIGHT = int(os.getenv("CRAWL_MAX_INFLIGHT", "32"))
+
+
+class HostLimiter:
+    """全局并发 + 按站点(host)并发的双重限流"""
+
+    def __init__(self, max_workers: int = CRAWL_MAX_WORKERS, per_host_limit: int = CRAWL_PER_HOST_LIMIT, max_inflight: int = CRAWL_MAX_INFLIGHT):
+        self.max_workers = max(1, max_workers)
+        self.per_host_limit = max(1, per_host_limit)
+        self._global = asyncio.Semaphore(self.max_workers)
+        self._hosts: Dict[str, asyncio.Semaphore] = {}
+        self._inflight = asyncio.Semaphore(max(self.max_workers, max_inflight))
+
+    def _host_semaphore(self, url: str) -> asyncio.Semaphore:
+        host = urlparse(url).netloc.lower()
+        if host not in self._hosts:
+            self._hosts[host] = asyncio.Semaphore(self.per_host_limit)
+        return self._hosts[host]
+
+    @asynccontextmanager
+    async def slot(self, url: str):
+        """占用站点和全局抓取名额，只应包住访问站点的部分"""
+        async with self._host_semaphore(url):
+            async with self._global:
+                yield
+
+    async def run(self, url: str, func: Callable[[str], Awaitable[Any]]) -> Any:
+        async with self.slot(url):
+            return await func(url)
+
+    async def run_inflight(self, url: str, func: Callable[[str], Awaitable[Any]]) -> Any:
+        """只限制同时处理中的 URL 数，站点名额由 func 自己通过 slot 占用"""
+        async with self._inflight:
+            return await func(url)
+
+
+async def fetch_all(
+    urls: List[str],
+    fetch_one: Callable[[str], Awaitable[Any]],
+    max_workers: int = CRAWL_MAX_WORKERS,
+    per_host_limit: int = CRAWL_PER_HOST_LIMIT,
+) -> List[Tuple[str, Optional[Any]]]:
+    """
+    以有限并发抓取一组 URL。
+
+    参数
+        urls： 要抓取的 URL 列表。
+        fetch_one： 抓取单个 URL 的协程函数，如 lambda u: crawler.arun(url=u, config=...)。
+        max_workers： 同时进行的抓取任务总数上限。
+        per_host_limit： 同一站点同时进行的抓取任务上限。
+
+    返回值
+        与输入顺序一致的 (url, result) 列表，抓取抛出异常时 result 为 None。
+    """
+    limiter = HostLimiter(max_workers, per_host_limit)
+
+    async def _guarded(url: str):
+        try:
+            return url, await limiter.run(url, fetch_one)
+        except Exception as e:
+            print(f"抓取 {url} 时出错: {e}")
+            return url, None
+
+    return await asyncio.gather(*(_guarded(url) for url in urls))
+
+
+async def iter_fetch(
+    urls: List[str],
+    fetch_one: Callable[[str], Awaitable[Any]],
+    max_workers: int = CRAWL_MAX_WORKERS,
+    per_host_limit: int = CRAWL_PER_HOST_LIMIT,
+    limiter: Optional[HostLimiter] = None,
+    fetch_takes_slot: bool = False,
+) -> AsyncIterator[Tuple[str, Optional[Any]]]:
+    """
+    与 fetch_all 相同的限流抓取，但按完成顺序逐个产出 (url, result)。
+
+    已完成的结果放入容量为 max_workers 的队列，下游消费变慢时抓取任务会在入队处等待，
+    从而形成背压，内存中的结果数量不会随 URL 数量增长。多个来源同时抓取时可传入共享的
+    limiter，使并发上限对所有来源整体生效。
+
+    fetch_takes_slot=True 时 fetch_one 只在访问站点时自己占用 limiter.slot(url)，
+    之后的 LLM 抽取等步骤不占站点名额，iter_fetch 只限制同时处理中的 URL 数。
+    """
+    limiter = limiter or HostLimiter(max_workers, per_host_limit)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=limiter.max_workers)
+
+    async def _fetch_and_put(url: str):
+        try:
+            result = await fetch_one(url)
+        except Exception as e:
+            print(f"抓取 {url} 时出错: {e}")
+            result = None
+        # 入队完成前不释放并发名额，保证背压生效
+        await queue.put((url, result))
+
+    run = limiter.run_inflight if fetch_takes_slot else limiter.run
+    tasks = [asyncio.create_task(run(url, _fetch_and_put)) for url in urls]
+    try:
+        for _ in range(len(tasks)):
+            yield await queue.get()
+    finally:
+        for task in tasks:
+            task.cancel()
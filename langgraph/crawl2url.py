@@ -5,6 +5,7 @@ from crawl4ai import AsyncWebCrawler, CrawlerRunConfig, CacheMode
 from crawl4ai.extraction_strategy import LLMExtractionStrategy    
 from crawl4ai.async_configs import LLMConfig    
 from pydantic import BaseModel, Field    
+from concurrent_fetch import fetch_all, CRAWL_MAX_WORKERS, CRAWL_PER_HOST_LIMIT
 import csv  
 
 
@@ -193,14 +194,19 @@ async def main():
                 
             print(f"\n开始第二层爬取：提取新闻详细内容...")
             
-            # 第二层：提取每个URL的新闻内容
+            # 第二层：以有限并发提取每个URL的新闻内容
+            results = await fetch_all(
+                [link['url'] for link in news_links],
+                lambda news_url: extract_news_content(crawler, news_url),
+                CRAWL_MAX_WORKERS,
+                CRAWL_PER_HOST_LIMIT,
+            )
+
             all_news = []
-            for i, link in enumerate(news_links, 1):
-                news_url = link['url']
+            for i, (news_url, news_content) in enumerate(results, 1):
                 print(f"\n处理第 {i}/{len(news_links)} 条新闻:")
                 print(f"URL: {news_url}")
                 
-                news_content = await extract_news_content(crawler, news_url)
                 if news_content:
                     if isinstance(news_content, list):
                         all_news.extend(news_content)
@@ -0,0 +1,143 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+from typing import Any, Dict, List, Set
+
+# 抓取检查点配置
+CHECKPOINT_DB_PATH = os.getenv("CHECKPOINT_DB_PATH", "crawl_checkpoint.db")
+# 是否从上一次未完成的运行继续（CRAWL_RESUME=0 时总是开始新的运行）
+CRAWL_RESUME = os.getenv("CRAWL_RESUME", "1") != "0"
+# 已完成的运行保留多久（秒）
+CHECKPOINT_RETENTION = int(os.getenv("CHECKPOINT_RETENTION", str(7 * 24 * 3600)))
+# 一篇文章最多分析几次：仍失败时标记为已处理（失败），不再让检查点一直保持未完成
+ANALYZE_MAX_ATTEMPTS = int(os.getenv("ANALYZE_MAX_ATTEMPTS", "3"))
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path)
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS crawl_runs (
+            run_id TEXT PRIMARY KEY,
+            urls TEXT,
+            status TEXT,
+            created REAL,
+            updated REAL
+        )"""
+    )
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS crawl_articles (
+            run_id TEXT,
+            url TEXT,
+            records TEXT,
+            completed REAL,
+            PRIMARY KEY (run_id, url)
+        )"""
+    )
+    # 旧版本的库没有 attempts 列
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(crawl_articles)")}
+    if "attempts" not in columns:
+        conn.execute("ALTER TABLE crawl_articles ADD COLUMN attempts INTEGER DEFAULT 0")
+    conn.commit()
+    return conn
+
+
+class CrawlCheckpoint:
+    """
+    一次抓取运行的检查点：每篇文章抽取完成后立即写入本地 SQLite。
+
+    进程中途退出后，下一次对同一组列表页的运行会从检查点恢复已完成的文章，
+    只抓取剩余部分。运行在结果保存完成后由 finish_runs 标记为 done；分析失败的文章由
+    record_failures 计数，达到 ANALYZE_MAX_ATTEMPTS 次后放弃，不再阻止运行结束。
+    """
+
+    def __init__(self, conn: sqlite3.Connection, run_id: str):
+        self.conn = conn
+        self.run_id = run_id
+
+    @classmethod
+    def open(cls, urls: List[str], resume: bool = CRAWL_RESUME, path: str = CHECKPOINT_DB_PATH) -> "CrawlCheckpoint":
+        """恢复同一组列表页最近一次未完成的运行，没有时新建一次运行"""
+        conn = _connect(path)
+        key = json.dumps(urls, ensure_ascii=False)
+        _purge(conn)
+        if resume:
+            row = conn.execute(
+                "SELECT run_id FROM crawl_runs WHERE urls = ? AND status = 'running' ORDER BY created DESC LIMIT 1",
+                (key,),
+            ).fetchone()
+            if row is not None:
+                return cls(conn, row[0])
+
+        now = time.time()
+        run_id = uuid.uuid4().hex[:12]
+        conn.execute(
+            "INSERT INTO crawl_runs (run_id, urls, status, created, updated) VALUES (?, ?, 'running', ?, ?)",
+            (run_id, key, now, now),
+        )
+        conn.commit()
+        return cls(conn, run_id)
+
+    def completed(self) -> Dict[str, List[Dict[str, Any]]]:
+        """本次运行中已完成文章的 url -> 记录列表"""
+        rows = self.conn.execute(
+            "SELECT url, records FROM crawl_articles WHERE run_id = ? ORDER BY completed", (self.run_id,)
+        ).fetchall()
+        return {url: json.loads(records) for url, records in rows}
+
+    def save_article(self, url: str, records: List[Dict[str, Any]]) -> None:
+        now = time.time()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO crawl_articles (run_id, url, records, completed) VALUES (?, ?, ?, ?)",
+            (self.run_id, url, json.dumps(records, ensure_ascii=False), now),
+        )
+        self.conn.execute("UPDATE crawl_runs SET updated = ? WHERE run_id = ?", (now, self.run_id))
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def _purge(conn: sqlite3.Connection) -> None:
+    cutoff = time.time() - CHECKPOINT_RETENTION
+    conn.execute(
+        "DELETE FROM crawl_articles WHERE run_id IN (SELECT run_id FROM crawl_runs WHERE status = 'done' AND updated < ?)",
+        (cutoff,),
+    )
+    conn.execute("DELETE FROM crawl_runs WHERE status = 'done' AND updated < ?", (cutoff,))
+    conn.commit()
+
+
+def finish_runs(urls: List[str], path: str = CHECKPOINT_DB_PATH) -> None:
+    """结果保存完成后，把这组列表页所有未完成的运行标记为 done"""
+    conn = _connect(path)
+    try:
+        conn.execute(
+            "UPDATE crawl_runs SET status = 'done', updated = ? WHERE urls = ? AND status = 'running'",
+            (time.time(), json.dumps(urls, ensure_ascii=False)),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def record_failures(urls: List[str], failed: Set[str], max_attempts: int = ANALYZE_MAX_ATTEMPTS, path: str = CHECKPOINT_DB_PATH) -> Set[str]:
+    """这组列表页未完成的运行中，分析失败的文章失败次数加一，返回已达上限、应当放弃的文章"""
+    if not failed:
+        return set()
+    conn = _connect(path)
+    try:
+        key = json.dumps(urls, ensure_ascii=False)
+        runs = "SELECT run_id FROM crawl_runs WHERE urls = ? AND status = 'running'"
+        with conn:
+            conn.executemany(
+                f"UPDATE crawl_articles SET attempts = COALESCE(attempts, 0) + 1 WHERE url = ? AND run_id IN ({runs})",
+                [(url, key) for url in failed],
+            )
+        rows = conn.execute(
+            f"SELECT DISTINCT url FROM crawl_articles WHERE attempts >= ? AND run_id IN ({runs})", (max_attempts, key)
+        ).fetchall()
+        return {row[0] for row in rows} & failed
+    finally:
+        conn.close()
@@ -0,0 +1,135 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+from typing import Any, Dict, List, Optional
+
+from sqlite_cache import purge_expired, evict_to_size
+
+# 抽取结果缓存配置
+EXTRACT_CACHE_PATH = os.getenv("EXTRACT_CACHE_PATH", "extraction_cache.db")
+# 缓存条目的有效期（秒），超过后删除
+EXTRACT_CACHE_TTL = int(os.getenv("EXTRACT_CACHE_TTL", str(7 * 24 * 3600)))
+# 在此时间内（秒）同一 URL 直接返回缓存，不再渲染页面核对内容
+EXTRACT_CACHE_REVALIDATE = int(os.getenv("EXTRACT_CACHE_REVALIDATE", "3600"))
+# 缓存总大小上限（字节），超过后按最近访问时间淘汰
+EXTRACT_CACHE_MAX_BYTES = int(os.getenv("EXTRACT_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+
+
+def _sha256(*parts: str) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+def schema_key(schema: Dict[str, Any], instruction: str) -> str:
+    """抽取 schema 与 instruction 的指纹，任意一个变化都会让旧缓存失效"""
+    return _sha256(json.dumps(schema, sort_keys=True, ensure_ascii=False), instruction)
+
+
+def page_markdown(result: Any) -> str:
+    """取 crawl4ai 抓取结果的 markdown 文本（兼容字符串和 MarkdownGenerationResult）"""
+    markdown = getattr(result, "markdown", None) or ""
+    if not isinstance(markdown, str):
+        markdown = getattr(markdown, "raw_markdown", "") or ""
+    return markdown
+
+
+def page_content_hash(result: Any, main_text: str = "") -> str:
+    """
+    计算页面内容哈希：优先使用裁剪出的正文（main_text），没有时退回整页 markdown / HTML。
+
+    整页中的相关新闻列表、阅读数等每次抓取都会变化，用整页计算时几乎不会命中“内容未变化”的缓存。
+    """
+    return _sha256(main_text or page_markdown(result) or getattr(result, "html", "") or "")
+
+
+class ExtractionCache:
+    """以 URL + 页面内容哈希 + 抽取 schema/instruction 为键的本地抽取结果缓存"""
+
+    def __init__(
+        self,
+        path: str = EXTRACT_CACHE_PATH,
+        ttl: int = EXTRACT_CACHE_TTL,
+        revalidate_after: int = EXTRACT_CACHE_REVALIDATE,
+        max_bytes: int = EXTRACT_CACHE_MAX_BYTES,
+    ):
+        self.ttl = ttl
+        self.revalidate_after = revalidate_after
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS extraction_cache (
+                key TEXT PRIMARY KEY,
+                url TEXT,
+                schema_key TEXT,
+                content_hash TEXT,
+                records TEXT,
+                size INTEGER,
+                created REAL,
+                last_access REAL
+            )"""
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_extraction_url ON extraction_cache (url, schema_key, created)"
+        )
+        self.conn.commit()
+        self.purge_expired()
+
+    def _touch(self, key: str) -> None:
+        self.conn.execute("UPDATE extraction_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+        self.conn.commit()
+
+    def get_fresh(self, url: str, skey: str) -> Optional[List[Dict[str, Any]]]:
+        """URL 在 revalidate_after 内抽取过时直接返回记录，无需渲染页面"""
+        row = self.conn.execute(
+            """SELECT key, records FROM extraction_cache
+               WHERE url = ? AND schema_key = ? AND created >= ?
+               ORDER BY created DESC LIMIT 1""",
+            (url, skey, time.time() - self.revalidate_after),
+        ).fetchone()
+        if row is None:
+            return None
+        self.hits += 1
+        self._touch(row[0])
+        return json.loads(row[1])
+
+    def get(self, url: str, chash: str, skey: str) -> Optional[List[Dict[str, Any]]]:
+        """页面内容未变化时返回之前的抽取记录"""
+        key = _sha256(url, chash, skey)
+        row = self.conn.execute(
+            "SELECT records FROM extraction_cache WHERE key = ? AND created >= ?",
+            (key, time.time() - self.ttl),
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._touch(key)
+        return json.loads(row[0])
+
+    def put(self, url: str, chash: str, skey: str, records: List[Dict[str, Any]]) -> None:
+        payload = json.dumps(records, ensure_ascii=False)
+        now = time.time()
+        self.conn.execute(
+            """INSERT OR REPLACE INTO extraction_cache
+               (key, url, schema_key, content_hash, records, size, created, last_access)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            (_sha256(url, chash, skey), url, skey, chash, payload, len(payload.encode("utf-8")), now, now),
+        )
+        self.conn.commit()
+        self._evict()
+
+    def purge_expired(self) -> None:
+        purge_expired(self.conn, "extraction_cache", self.ttl)
+
+    def _evict(self) -> None:
+        evict_to_size(self.conn, "extraction_cache", self.max_bytes)
+
+    def close(self) -> None:
+        self.conn.close()
@@ -0,0 +1,107 @@
+import os
+import asyncio
+from typing import Any, Optional
+from urllib.parse import urlparse
+
+import httpx
+from bs4 import BeautifulSoup
+from crawl4ai import CrawlerRunConfig, CacheMode
+
+# 服务端渲染的静态站点，文章页可以不经过浏览器直接抓取
+STATIC_HOSTS = {h.strip().lower() for h in os.getenv("STATIC_HOSTS", "finance.eastmoney.com").split(",") if h.strip()}
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "15"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+# HTTP 抓取到的正文少于这个字数时视为需要浏览器渲染
+HTTP_MIN_BODY_CHARS = int(os.getenv("HTTP_MIN_BODY_CHARS", "50"))
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36",
+    "Accept-Language": "zh-CN,zh;q=0.9",
+}
+
+
+def is_static(url: str) -> bool:
+    return urlparse(url).netloc.lower() in STATIC_HOSTS
+
+
+def body_text(html: str) -> str:
+    """取页面中所有 <p> 标签的文本，用于判断正文是否为空"""
+    soup = BeautifulSoup(html, "html.parser")
+    return "\n".join(p.get_text(strip=True) for p in soup.find_all("p"))
+
+
+class HttpFetcher:
+    """带连接池和 keep-alive 的异步 HTTP 客户端"""
+
+    def __init__(self, timeout: float = HTTP_TIMEOUT, max_connections: int = HTTP_MAX_CONNECTIONS):
+        self.client = httpx.AsyncClient(
+            headers=HEADERS,
+            timeout=timeout,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+        self.loop = asyncio.get_running_loop()
+
+    async def fetch_html(self, url: str) -> Optional[str]:
+        try:
+            response = await self.client.get(url)
+            response.raise_for_status()
+            return response.text
+        except httpx.HTTPError as e:
+            print(f"HTTP 抓取 {url} 失败: {e}")
+            return None
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+
+_fetcher: Optional[HttpFetcher] = None
+
+
+def get_http_fetcher() -> HttpFetcher:
+    """获取进程内共享的 HTTP 客户端"""
+    global _fetcher
+    if _fetcher is None or _fetcher.loop is not asyncio.get_running_loop():
+        _fetcher = HttpFetcher()
+    return _fetcher
+
+
+async def close_http_fetcher() -> None:
+    global _fetcher
+    if _fetcher is not None:
+        await _fetcher.aclose()
+        _fetcher = None
+
+
+async def fetch_via_http(crawler: Any, url: str, min_chars: int = HTTP_MIN_BODY_CHARS) -> Optional[Any]:
+    """
+    只用 HTTP 抓取页面，再交给 crawl4ai 以 raw: 方式生成 markdown（不启动页面渲染）。
+
+    返回值
+        crawl4ai 抓取结果；请求失败或正文少于 min_chars 时返回 None。
+    """
+    html = await get_http_fetcher().fetch_html(url)
+    if not html or len(body_text(html)) < min_chars:
+        return None
+    result = await crawler.arun(
+        url="raw:" + html,
+        config=CrawlerRunConfig(word_count_threshold=1, cache_mode=CacheMode.BYPASS),
+    )
+    return result if result.success else None
+
+
+async def fetch_via_browser(crawler: Any, url: str) -> Any:
+    return await crawler.arun(
+        url=url,
+        config=CrawlerRunConfig(word_count_threshold=1, cache_mode=CacheMode.BYPASS),
+    )
+
+
+async def fetch_page(crawler: Any, url: str) -> Any:
+    """静态站点优先走 HTTP 快速通道，正文为空时回退到浏览器渲染"""
+    if is_static(url):
+        result = await fetch_via_http(crawler, url)
+        if result is not None:
+            return result
+        print(f"HTTP 抓取正文为空，回退到浏览器: {url}")
+    return await fetch_via_browser(crawler, url)
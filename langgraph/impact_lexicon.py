@@ -0,0 +1,188 @@
+import os
+import re
+import csv
+from typing import Dict, List, Optional, Tuple
+
+from record_store import history_files
+
+# 本地词典预分类配置（IMPACT_LEXICON_ENABLED=0 关闭）
+IMPACT_LEXICON_ENABLED = os.getenv("IMPACT_LEXICON_ENABLED", "1") != "0"
+# 置信度不低于该值时直接采用词典结果，不再调用 LLM
+IMPACT_LEXICON_THRESHOLD = float(os.getenv("IMPACT_LEXICON_THRESHOLD", "0.9"))
+# 用于校准置信度的历史因子文件（包括按日期分出的 factor-YYYY-MM-DD.csv）
+IMPACT_LEXICON_HISTORY = os.getenv("IMPACT_LEXICON_HISTORY", "factor.csv")
+# 校准时先验置信度相当于多少条历史样本
+IMPACT_LEXICON_PRIOR_WEIGHT = float(os.getenv("IMPACT_LEXICON_PRIOR_WEIGHT", "5"))
+
+
+class LexiconRule:
+    """
+    一条标题规则。
+
+    参数
+        name： 规则名称，用于日志和统计。
+        label： 命中时的影响方向（1 / 0 / -1）。
+        pattern： 匹配新闻标题的正则。
+        prior： 没有历史数据时的置信度。
+        exclude： 可选，否定、终止、撤销等反转含义的写法，命中时规则不生效。
+    """
+
+    def __init__(self, name: str, label: int, pattern: str, prior: float, exclude: Optional[str] = None):
+        self.name = name
+        self.label = label
+        self.pattern = re.compile(pattern)
+        self.prior = prior
+        self.exclude = re.compile(exclude) if exclude else None
+
+    def matches(self, title: str) -> bool:
+        if self.exclude is not None and self.exclude.search(title):
+            return False
+        return bool(self.pattern.search(title))
+
+
+# 例行公告几乎总是中性，先验置信度高；带方向的关键词需要历史数据校准后才会越过阈值。
+# 带方向的规则都要排除否定和终止的写法（“不减持”“终止减持”“撤销立案”），否则会给出相反的方向
+LEXICON_RULES: List[LexiconRule] = [
+    LexiconRule("dividend", 0, r"权益分派实施|分红派息实施|利润分配.{0,4}实施", 0.95),
+    LexiconRule("meeting_notice", 0, r"召开.{0,12}股东(大)?会|股东(大)?会.{0,4}通知|股东(大)?会决议", 0.95),
+    LexiconRule("board_resolution", 0, r"董事会决议公告|监事会决议公告|独立董事.{0,8}意见|法律意见书", 0.95),
+    LexiconRule("correction", 0, r"更正公告|补充公告|更正.{0,4}说明", 0.95),
+    LexiconRule("abnormal_trading", 0, r"股票交易异常波动|非理性炒作|交易价格涨幅较大", 0.9),
+    LexiconRule("suspension", 0, r"停牌|复牌", 0.8),
+    LexiconRule(
+        "share_reduction", -1, r"拟?减持", 0.85,
+        exclude=r"(不|未|无|暂不|放弃|终止|取消|中止).{0,4}减持|减持.{0,8}(终止|取消|完成|完毕|结束|届满|期满|到期)",
+    ),
+    LexiconRule(
+        "investigation", -1, r"立案|行政处罚|监管措施|警示函|通报批评|公开谴责", 0.85,
+        exclude=r"(撤销|解除|终止|结束|不予|免于|撤回|取消).{0,6}(立案|调查|处罚|监管措施|警示函)|(立案|调查).{0,6}(撤销|终止|结案|完毕|解除)|结案",
+    ),
+    LexiconRule(
+        "delisting", -1, r"终止上市|退市风险警示", 0.85,
+        exclude=r"(撤销|解除|撤除|不触及|未触及).{0,6}(退市|风险警示|终止上市)",
+    ),
+    LexiconRule(
+        "buyback", 1, r"回购.{0,6}股份|增持", 0.8,
+        exclude=r"(终止|取消|放弃|暂停|不|未).{0,6}(回购|增持)|(回购|增持).{0,8}(终止|取消|未实施|未完成)|回购注销",
+    ),
+    LexiconRule("contract_win", 1, r"中标|签订.{0,8}重大合同", 0.8, exclude=r"未中标|(终止|解除|取消).{0,8}合同"),
+    LexiconRule(
+        "approval", 1, r"(获得|取得|收到).{0,8}(注册证|批准|批件|受理通知)", 0.8,
+        exclude=r"(未|不予|未能|没有).{0,4}(获得|取得|批准|注册)|撤回.{0,8}申请",
+    ),
+]
+
+
+# 因子数据中标记判定来源的列名和词典判定的取值
+SOURCE_COLUMN = "判定来源"
+SOURCE_LEXICON = "lexicon"
+
+
+def is_lexicon_row(row: Dict[str, str]) -> bool:
+    """历史因子行是否由词典判定；没有来源列的旧数据中，词典判定的行以标题作为摘要"""
+    if row.get(SOURCE_COLUMN):
+        return row[SOURCE_COLUMN] == SOURCE_LEXICON
+    return bool(row.get("新闻摘要")) and row.get("新闻摘要") == row.get("新闻标题")
+
+
+class LexiconStats:
+    """预分类统计：本地判定和送往 LLM 的文章数"""
+
+    def __init__(self):
+        self.local = 0
+        self.llm = 0
+        self.by_rule: Dict[str, int] = {}
+
+    def record(self, rule: Optional[LexiconRule]) -> None:
+        if rule is None:
+            self.llm += 1
+        else:
+            self.local += 1
+            self.by_rule[rule.name] = self.by_rule.get(rule.name, 0) + 1
+
+    def report(self) -> str:
+        total = self.local + self.llm
+        ratio = self.local / total if total else 0
+        detail = "，".join(f"{name} {count}" for name, count in sorted(self.by_rule.items(), key=lambda x: -x[1]))
+        return f"词典预分类: 本地判定 {self.local} 篇，LLM 分析 {self.llm} 篇，节省 LLM 调用 {ratio:.0%}" + (f"（{detail}）" if detail else "")
+
+
+class ImpactLexicon:
+    """
+    新闻影响方向的本地预分类器。
+
+    按标题匹配规则，用历史 factor.csv 中相同规则的标注校准置信度：
+    confidence = (与规则方向一致的样本数 + prior * prior_weight) / (样本数 + prior_weight)。
+    词典自己判定的历史行不参与校准，否则规则越过阈值后会用自己的输出不断抬高自己的置信度。
+    多条规则给出不同方向时视为不确定。
+    """
+
+    def __init__(
+        self,
+        rules: List[LexiconRule] = LEXICON_RULES,
+        threshold: float = IMPACT_LEXICON_THRESHOLD,
+        history_path: Optional[str] = IMPACT_LEXICON_HISTORY,
+        prior_weight: float = IMPACT_LEXICON_PRIOR_WEIGHT,
+    ):
+        self.rules = rules
+        self.threshold = threshold
+        self.prior_weight = prior_weight
+        self.confidence = {rule.name: rule.prior for rule in rules}
+        self.samples = {rule.name: 0 for rule in rules}
+        paths = history_files(history_path) if history_path else []
+        if paths:
+            self.calibrate(paths)
+
+    def calibrate(self, history_paths: List[str]) -> None:
+        """用历史因子数据（新闻标题、影响方向两列）校准各规则的置信度"""
+        agree = {rule.name: 0 for rule in self.rules}
+        total = {rule.name: 0 for rule in self.rules}
+        try:
+            for history_path in history_paths:
+                with open(history_path, newline="", encoding="utf-8") as f:
+                    for row in csv.DictReader(f):
+                        if is_lexicon_row(row):
+                            continue
+                        title = row.get("新闻标题", "")
+                        try:
+                            label = int(row.get("影响方向", ""))
+                        except ValueError:
+                            continue
+                        for rule in self.rules:
+                            if rule.matches(title):
+                                total[rule.name] += 1
+                                agree[rule.name] += label == rule.label
+        except (OSError, csv.Error) as e:
+            print(f"读取历史因子数据失败，词典使用先验置信度: {str(e)}")
+            return
+        for rule in self.rules:
+            self.samples[rule.name] = total[rule.name]
+            self.confidence[rule.name] = (agree[rule.name] + rule.prior * self.prior_weight) / (total[rule.name] + self.prior_weight)
+
+    def score(self, title: str) -> Optional[Tuple[int, float, LexiconRule]]:
+        """返回 (影响方向, 置信度, 命中的规则)；没有命中或规则之间矛盾时返回 None"""
+        matched = [rule for rule in self.rules if rule.matches(title)]
+        if not matched or len({rule.label for rule in matched}) > 1:
+            return None
+        best = max(matched, key=lambda rule: self.confidence[rule.name])
+        return best.label, self.confidence[best.name], best
+
+    def classify(self, title: str) -> Optional[Tuple[int, LexiconRule]]:
+        """置信度达到阈值时返回 (影响方向, 规则)，否则返回 None，交给 LLM 分析"""
+        scored = self.score(title)
+        if scored is None or scored[1] < self.threshold:
+            return None
+        return scored[0], scored[2]
+
+
+_lexicon: Optional[ImpactLexicon] = None
+
+
+def get_impact_lexicon() -> Optional[ImpactLexicon]:
+    """返回进程内共享的预分类器，IMPACT_LEXICON_ENABLED=0 时返回 None"""
+    global _lexicon
+    if not IMPACT_LEXICON_ENABLED:
+        return None
+    if _lexicon is None:
+        _lexicon = ImpactLexicon()
+    return _lexicon
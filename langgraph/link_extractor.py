@@ -0,0 +1,73 @@
+import re
+from typing import Any, Dict, List, Optional
+from urllib.parse import urljoin, urlparse
+
+# 各新闻列表页对应的文章链接规则：列表页 host -> 文章 URL 正则
+LINK_RULES: Dict[str, List[str]] = {
+    "kuaixun.eastmoney.com": [r"^https?://finance\.eastmoney\.com/a/\d+\.html$"],
+    "finance.eastmoney.com": [r"^https?://finance\.eastmoney\.com/a/\d+\.html$"],
+}
+
+# 没有专门规则时使用的通用规则（与 crawl2url.extract_news_links 中的 '/a/' 过滤一致）
+DEFAULT_LINK_RULES: List[str] = [r"^https?://[^/]+/a/\d+\.html$"]
+
+_MARKDOWN_URL = re.compile(r"\((https?://[^\s)]+|//[^\s)]+)\)|(?<![(\w])(https?://[^\s<>\"')\]]+)")
+
+
+def register_link_rule(host: str, pattern: str) -> None:
+    """为某个列表页 host 注册一条文章链接正则"""
+    LINK_RULES.setdefault(host.lower(), []).append(pattern)
+
+
+def get_link_rules(page_url: str) -> List[str]:
+    return LINK_RULES.get(urlparse(page_url).netloc.lower(), DEFAULT_LINK_RULES)
+
+
+def _normalize(href: str, page_url: str) -> str:
+    href = href.strip()
+    if href.startswith("//"):
+        return "https:" + href
+    return urljoin(page_url, href)
+
+
+def _candidate_hrefs(result: Any) -> List[str]:
+    """从 crawl4ai 的 CrawlResult 中收集候选链接：先取 result.links，再扫描 markdown"""
+    hrefs = []
+    links = getattr(result, "links", None) or {}
+    for group in ("internal", "external"):
+        for link in links.get(group, []) or []:
+            href = link.get("href") if isinstance(link, dict) else link
+            if href:
+                hrefs.append(href)
+
+    markdown = getattr(result, "markdown", None) or ""
+    if not isinstance(markdown, str):
+        markdown = getattr(markdown, "raw_markdown", "") or ""
+    for m in _MARKDOWN_URL.finditer(markdown):
+        hrefs.append(m.group(1) or m.group(2))
+    return hrefs
+
+
+def extract_article_links(result: Any, page_url: str, patterns: Optional[List[str]] = None) -> List[str]:
+    """
+    按规则从列表页抓取结果中提取文章链接。
+
+    参数
+        result： 列表页的 crawl4ai 抓取结果（不带 extraction_strategy）。
+        page_url： 列表页 URL，用于选择规则和补全相对链接。
+        patterns： 自定义正则列表，默认按 page_url 的 host 从 LINK_RULES 中选取。
+
+    返回值
+        去重后的文章链接列表（保持页面中的先后顺序），没有规则命中时为空列表。
+    """
+    compiled = [re.compile(p) for p in (patterns or get_link_rules(page_url))]
+    news_links = []
+    seen = set()
+    for href in _candidate_hrefs(result):
+        url = _normalize(href, page_url)
+        if url in seen:
+            continue
+        if any(p.match(url) for p in compiled):
+            seen.add(url)
+            news_links.append(url)
+    return news_links
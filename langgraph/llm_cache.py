@@ -0,0 +1,173 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+from typing import Any, Optional
+
+from langchain_core.messages import AIMessage
+from sqlite_cache import purge_expired, evict_to_size
+
+# LLM 响应缓存配置（LLM_CACHE_ENABLED=0 关闭）
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") != "0"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.db")
+# 缓存条目的有效期（秒）
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(30 * 24 * 3600)))
+# 缓存总大小上限（字节），超过后按最近访问时间淘汰
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(100 * 1024 * 1024)))
+
+_SPACES = re.compile(r"[ \t　]+")
+
+
+def normalize_input(value: Any) -> str:
+    """把 prompt 或消息列表转成规范文本：去掉每行首尾空白和空行，合并连续空格"""
+    if isinstance(value, str):
+        text = value
+    elif isinstance(value, (list, tuple)):
+        text = "\n".join(f"[{getattr(m, 'type', '')}] {getattr(m, 'content', m)}" for m in value)
+    else:
+        text = str(value)
+    lines = (_SPACES.sub(" ", line).strip() for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def model_name(llm: Any) -> str:
+    return getattr(llm, "model_name", None) or getattr(llm, "model", None) or type(llm).__name__
+
+
+def cache_key(model: str, version: str, value: Any) -> str:
+    h = hashlib.sha256()
+    for part in (model, version, normalize_input(value)):
+        h.update(part.encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+class LLMResponseCache:
+    """以模型名 + prompt 模板版本 + 规范化输入为键的本地 LLM 响应缓存"""
+
+    def __init__(self, path: str = LLM_CACHE_PATH, ttl: int = LLM_CACHE_TTL, max_bytes: int = LLM_CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                version TEXT,
+                content TEXT,
+                size INTEGER,
+                created REAL,
+                last_access REAL
+            )"""
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_access ON llm_cache (last_access)")
+        self.conn.commit()
+        self.purge_expired()
+
+    def get(self, key: str) -> Optional[str]:
+        row = self.conn.execute(
+            "SELECT content FROM llm_cache WHERE key = ? AND created >= ?", (key, time.time() - self.ttl)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+        self.conn.commit()
+        return row[0]
+
+    def put(self, key: str, model: str, version: str, content: str) -> None:
+        now = time.time()
+        self.conn.execute(
+            """INSERT OR REPLACE INTO llm_cache (key, model, version, content, size, created, last_access)
+               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            (key, model, version, content, len(content.encode("utf-8")), now, now),
+        )
+        self.conn.commit()
+        self._evict()
+
+    def forget(self, key: str) -> None:
+        self.conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+        self.conn.commit()
+
+    def purge_expired(self) -> None:
+        purge_expired(self.conn, "llm_cache", self.ttl)
+
+    def _evict(self) -> None:
+        evict_to_size(self.conn, "llm_cache", self.max_bytes)
+
+    def stats(self) -> str:
+        total = self.hits + self.misses
+        ratio = self.hits / total if total else 0
+        return f"LLM 响应缓存: 命中 {self.hits}, 未命中 {self.misses}（命中率 {ratio:.0%}）"
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+_llm_cache: Optional[LLMResponseCache] = None
+
+
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    """返回进程内共享的响应缓存，LLM_CACHE_ENABLED=0 时返回 None"""
+    global _llm_cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    if _llm_cache is None:
+        _llm_cache = LLMResponseCache()
+    return _llm_cache
+
+
+def close_llm_cache() -> None:
+    global _llm_cache
+    if _llm_cache is not None:
+        _llm_cache.close()
+        _llm_cache = None
+
+
+class CachedLLM:
+    """
+    给聊天模型加一层持久化响应缓存。
+
+    与 ChatTongyi 一样提供 invoke / ainvoke，可直接替换原模型使用；缓存未启用时直接调用原模型。
+    version 是 prompt 模板的版本号，修改模板后应同时修改版本号，使旧响应失效。
+    """
+
+    def __init__(self, llm: Any, version: str, cache: Optional[LLMResponseCache] = None):
+        self.llm = llm
+        self.version = version
+        self.model = model_name(llm)
+        self.cache = cache if cache is not None else get_llm_cache()
+
+    def _key(self, value: Any) -> str:
+        return cache_key(self.model, self.version, value)
+
+    def lookup(self, value: Any) -> Optional[str]:
+        """查询缓存的响应，缓存未启用或未命中时返回 None"""
+        if self.cache is None:
+            return None
+        return self.cache.get(self._key(value))
+
+    def store(self, value: Any, content: str) -> None:
+        """写入响应；调用方可以只缓存校验通过的结果"""
+        if self.cache is not None:
+            self.cache.put(self._key(value), self.model, self.version, content)
+
+    async def ainvoke(self, value: Any, **kwargs) -> Any:
+        content = self.lookup(value)
+        if content is not None:
+            return AIMessage(content=content)
+        response = await self.llm.ainvoke(value, **kwargs)
+        self.store(value, response.content)
+        return response
+
+    def invoke(self, value: Any, **kwargs) -> Any:
+        content = self.lookup(value)
+        if content is not None:
+            return AIMessage(content=content)
+        response = self.llm.invoke(value, **kwargs)
+        self.store(value, response.content)
+        return response
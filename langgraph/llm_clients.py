@@ -0,0 +1,134 @@
+import os
+import asyncio
+from typing import Any, Dict, Optional
+
+import httpx
+import litellm
+from langchain_openai import ChatOpenAI
+from crawl4ai.async_configs import LLMConfig
+
+from llm_resilience import ProviderGuard
+
+# LLM 连接池配置
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+LLM_HTTP_TIMEOUT = float(os.getenv("LLM_HTTP_TIMEOUT", "120"))
+
+
+def provider_settings(provider: str) -> Dict[str, str]:
+    """从环境变量（.env）读取供应商配置；调用时读取，保证 load_dotenv 已经执行"""
+    if provider == "dashscope":
+        return {
+            "api_key": os.getenv("DASHSCOPE_API_KEY", ""),
+            # DashScope 的 OpenAI 兼容接口，可以复用 HTTP 连接
+            "base_url": os.getenv("DASHSCOPE_BASE_URL") or os.getenv("base_url") or "https://dashscope.aliyuncs.com/compatible-mode/v1",
+        }
+    if provider == "deepseek":
+        return {
+            "api_key": os.getenv("DEEPSEEK_API_KEY", ""),
+            "base_url": os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com"),
+            "model": os.getenv("DEEPSEEK_MODEL", "deepseek-chat").strip(),
+        }
+    raise ValueError(f"未知的 LLM 供应商: {provider}")
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_MAX_CONNECTIONS,
+        keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+    )
+
+
+class ProviderPool:
+    """一个供应商的同步 / 异步 keep-alive 连接池，以及该供应商的容错层"""
+
+    def __init__(self, provider: str):
+        self.provider = provider
+        self.settings = provider_settings(provider)
+        self.http_client = httpx.Client(timeout=LLM_HTTP_TIMEOUT, limits=_limits())
+        self.async_client = httpx.AsyncClient(timeout=LLM_HTTP_TIMEOUT, limits=_limits())
+        self.guard = ProviderGuard(provider)
+
+    async def aclose(self) -> None:
+        self.http_client.close()
+        await self.async_client.aclose()
+
+
+class LLMClients:
+    """
+    进程内共享的 LLM 客户端注册表。
+
+    每个供应商（DashScope、DeepSeek）一组连接池，每个模型只创建一个客户端，
+    分析工具、对话节点和抓取抽取都从这里取客户端，避免每次调用重新建立连接和 TLS 握手。
+    """
+
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.pools: Dict[str, ProviderPool] = {}
+        self.chat_models: Dict[str, Any] = {}
+        self.llm_configs: Dict[str, LLMConfig] = {}
+
+    def pool(self, provider: str) -> ProviderPool:
+        if provider not in self.pools:
+            self.pools[provider] = ProviderPool(provider)
+            if provider == "deepseek":
+                # crawl4ai 的 LLMExtractionStrategy 和 batch_extract 都通过 litellm 调用 DeepSeek
+                litellm.client_session = self.pools[provider].http_client
+                litellm.aclient_session = self.pools[provider].async_client
+        return self.pools[provider]
+
+    def chat_model(self, model: str = "qwen-plus") -> ChatOpenAI:
+        """DashScope 上的聊天模型（通过 OpenAI 兼容接口）"""
+        if model not in self.chat_models:
+            pool = self.pool("dashscope")
+            self.chat_models[model] = ChatOpenAI(
+                model=model,
+                api_key=pool.settings["api_key"],
+                base_url=pool.settings["base_url"],
+                http_client=pool.http_client,
+                http_async_client=pool.async_client,
+                # 重试由 ProviderGuard 统一处理
+                max_retries=0,
+            )
+        return self.chat_models[model]
+
+    def guard(self, provider: str) -> ProviderGuard:
+        """供应商的容错层（重试、熔断、AIMD 并发限制）"""
+        return self.pool(provider).guard
+
+    def llm_config(self, provider: str = "deepseek") -> LLMConfig:
+        """crawl4ai 抽取使用的 LLMConfig"""
+        if provider not in self.llm_configs:
+            settings = self.pool(provider).settings
+            self.llm_configs[provider] = LLMConfig(
+                provider=f"{provider}/{settings['model']}",
+                api_token=settings["api_key"],
+                base_url=settings["base_url"],
+            )
+        return self.llm_configs[provider]
+
+    async def aclose(self) -> None:
+        for pool in self.pools.values():
+            await pool.aclose()
+        if "deepseek" in self.pools:
+            litellm.client_session = None
+            litellm.aclient_session = None
+
+
+_clients: Optional[LLMClients] = None
+
+
+def get_llm_clients() -> LLMClients:
+    """获取进程内共享的 LLM 客户端注册表（事件循环变化时重新创建，异步连接池不能跨事件循环使用）"""
+    global _clients
+    if _clients is None or _clients.loop is not asyncio.get_running_loop():
+        _clients = LLMClients()
+    return _clients
+
+
+async def close_llm_clients() -> None:
+    global _clients
+    if _clients is not None:
+        await _clients.aclose()
+        _clients = None
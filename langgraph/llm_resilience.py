@@ -0,0 +1,286 @@
+import os
+import re
+import time
+import random
+import asyncio
+from email.utils import parsedate_to_datetime
+from collections import deque
+from typing import Awaitable, Callable, Deque, Optional, TypeVar
+
+import httpx
+
+# 重试配置：最多重试次数、指数退避的初始 / 最大等待时间（秒）
+LLM_RETRY_MAX = int(os.getenv("LLM_RETRY_MAX", "5"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "1"))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "60"))
+# 熔断配置：连续失败多少次后熔断，熔断后多久（秒）放行一次试探请求
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+# 熔断期间请求最多等待多久（秒）再放弃，等待期间不丢弃请求
+LLM_BREAKER_MAX_WAIT = float(os.getenv("LLM_BREAKER_MAX_WAIT", "600"))
+# AIMD 并发配置：初始 / 最小 / 最大并发数
+LLM_AIMD_INITIAL = int(os.getenv("LLM_AIMD_INITIAL", "8"))
+LLM_AIMD_MIN = int(os.getenv("LLM_AIMD_MIN", "1"))
+LLM_AIMD_MAX = int(os.getenv("LLM_AIMD_MAX", "32"))
+
+T = TypeVar("T")
+
+# litellm 异常类名 -> HTTP 状态码，用于解析 crawl4ai 错误块中只剩文字的异常
+_ERROR_CLASSES = {
+    "ContextWindowExceededError": 400,
+    "ContentPolicyViolationError": 400,
+    "BadRequestError": 400,
+    "AuthenticationError": 401,
+    "PermissionDeniedError": 403,
+    "NotFoundError": 404,
+    "UnprocessableEntityError": 422,
+    "RateLimitError": 429,
+    "InternalServerError": 500,
+    "ServiceUnavailableError": 503,
+    "Timeout": 408,
+}
+_STATUS_IN_MESSAGE = re.compile(r"(?:status[ _]?code|error code|http)\W{0,3}([45]\d\d)\b", re.I)
+
+
+class ProviderError(Exception):
+    """供应商返回的错误（例如抽取结果中的错误块），status_code 未知时为 None"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class CircuitOpenError(Exception):
+    """供应商处于熔断状态，请求未发出"""
+
+
+def status_code(error: BaseException) -> Optional[int]:
+    code = getattr(error, "status_code", None)
+    if code is None:
+        code = getattr(getattr(error, "response", None), "status_code", None)
+    return code if isinstance(code, int) else None
+
+
+def message_status(message: str) -> Optional[int]:
+    """从错误文字中推断状态码（异常类名或“status code 400”之类的字样），推断不出时返回 None"""
+    for name, code in _ERROR_CLASSES.items():
+        if name in message:
+            return code
+    match = _STATUS_IN_MESSAGE.search(message)
+    return int(match.group(1)) if match else None
+
+
+def is_throttled(error: BaseException) -> bool:
+    if status_code(error) == 429 or "RateLimit" in type(error).__name__:
+        return True
+    message = str(error).lower()
+    return "429" in message or "rate limit" in message or "throttling" in message
+
+
+def is_retryable(error: BaseException) -> bool:
+    """限流、5xx、超时和连接错误可以重试；鉴权、参数等 4xx 错误重试也不会成功"""
+    if is_throttled(error):
+        return True
+    code = status_code(error)
+    if code is not None:
+        return code >= 500 or code == 408
+    if isinstance(error, (asyncio.TimeoutError, httpx.TransportError)):
+        return True
+    name = type(error).__name__
+    return isinstance(error, ProviderError) or "Timeout" in name or "Connection" in name
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """读取响应头中的 retry-after（秒数或 HTTP 日期）"""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, base: float = LLM_RETRY_BASE_DELAY, maximum: float = LLM_RETRY_MAX_DELAY) -> float:
+    """带抖动的指数退避：在 [d/2, d] 之间随机，d = base * 2^attempt"""
+    delay = min(maximum, base * (2 ** attempt))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class AIMDLimiter:
+    """
+    加性增、乘性减的并发限制。
+
+    每次成功把上限加 1/上限（约每一轮并发加 1），遇到限流把上限减半；
+    同一秒内的多次限流只减一次，避免一批并发请求同时被限流时上限直接降到最低。
+    """
+
+    def __init__(self, initial: int = LLM_AIMD_INITIAL, minimum: int = LLM_AIMD_MIN, maximum: int = LLM_AIMD_MAX):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    async def acquire(self) -> None:
+        while self.in_flight >= int(self.limit):
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+        self.in_flight += 1
+
+    def release(self, throttled: bool = False, succeeded: bool = False) -> None:
+        self.in_flight -= 1
+        now = time.monotonic()
+        if throttled and now - self._last_decrease >= 1:
+            self.limit = max(self.minimum, self.limit / 2)
+            self._last_decrease = now
+        elif succeeded:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+        free = int(self.limit) - self.in_flight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+
+class CircuitBreaker:
+    """连续失败达到阈值后熔断，冷却时间过后放行一个试探请求，成功则恢复"""
+
+    def __init__(self, threshold: int = LLM_BREAKER_THRESHOLD, cooldown: float = LLM_BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+        self.trips = 0
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if not self.probing and time.monotonic() - self.opened_at >= self.cooldown:
+            self.probing = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def remaining(self) -> float:
+        """距离放行下一个试探请求还有多久（秒）"""
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.opened_at + self.cooldown - time.monotonic())
+
+    def cancel_probe(self) -> None:
+        """试探请求没有得出结果（被取消、被限流）时，允许下一个请求重新试探"""
+        self.probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.probing or (self.opened_at is None and self.failures >= self.threshold):
+            self.opened_at = time.monotonic()
+            self.probing = False
+            self.trips += 1
+
+
+class ProviderGuard:
+    """
+    一个 LLM 供应商的容错层：AIMD 并发限制 + 熔断 + 带抖动的指数退避重试。
+
+    限流（429）只降低并发，不计入熔断；服务端错误、超时和连接错误计入熔断。
+    熔断期间的请求等待冷却结束后再发出，累计等待超过 LLM_BREAKER_MAX_WAIT 才抛出 CircuitOpenError。
+    """
+
+    def __init__(self, name: str, max_retries: int = LLM_RETRY_MAX):
+        self.name = name
+        self.max_retries = max_retries
+        self.limiter = AIMDLimiter()
+        self.breaker = CircuitBreaker()
+        self.calls = 0
+        self.retries = 0
+        self.throttled = 0
+        self.failed = 0
+
+    async def call(self, func: Callable[[], Awaitable[T]]) -> T:
+        attempt = 0
+        waited = 0.0
+        while True:
+            if not self.breaker.allow():
+                # 冷却已过但试探请求还没有结果时，稍后再看
+                delay = self.breaker.remaining() or 1.0
+                if waited + delay > LLM_BREAKER_MAX_WAIT:
+                    self.failed += 1
+                    raise CircuitOpenError(f"{self.name} 处于熔断状态，已等待 {waited:.0f} 秒")
+                waited += delay
+                await asyncio.sleep(delay)
+                continue
+            # 熔断冷却后放行的试探请求：被取消等没有得出结果的退出路径都要交还试探机会，否则熔断永远不会恢复
+            probe = self.breaker.probing
+            try:
+                await self.limiter.acquire()
+            except BaseException:
+                if probe:
+                    self.breaker.cancel_probe()
+                raise
+            self.calls += 1
+            try:
+                result = await func()
+            except Exception as e:
+                throttled = is_throttled(e)
+                self.limiter.release(throttled=throttled)
+                if throttled:
+                    self.throttled += 1
+                    # 限流不代表服务不可用；熔断中的试探请求被限流时重新放行下一个试探
+                    self.breaker.cancel_probe()
+                elif is_retryable(e):
+                    self.breaker.record_failure()
+                else:
+                    # 参数、鉴权等错误说明服务本身可用
+                    self.breaker.record_success()
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    self.failed += 1
+                    raise
+                delay = retry_after(e)
+                delay = backoff_delay(attempt) if delay is None else min(delay, LLM_RETRY_MAX_DELAY)
+                print(f"{self.name} 请求失败（{type(e).__name__}: {str(e)[:120]}），{delay:.1f} 秒后第 {attempt + 1} 次重试")
+                self.retries += 1
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # 被取消（抓取任务取消、流式生产者退出等）
+                self.limiter.release()
+                if probe:
+                    self.breaker.cancel_probe()
+                raise
+            self.limiter.release(succeeded=True)
+            self.breaker.record_success()
+            return result
+
+    def report(self) -> str:
+        return (
+            f"{self.name}: 请求 {self.calls} 次，重试 {self.retries} 次，限流 {self.throttled} 次，"
+            f"失败 {self.failed} 次，熔断 {self.breaker.trips} 次，当前并发上限 {int(self.limiter.limit)}"
+        )
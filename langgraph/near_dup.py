@@ -0,0 +1,173 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+# 近似重复检测配置
+NEAR_DUP_ENABLED = os.getenv("NEAR_DUP_ENABLED", "1") != "0"
+NEAR_DUP_DB_PATH = os.getenv("NEAR_DUP_DB_PATH", "near_dup.db")
+# SimHash 海明距离不超过该值视为同一条新闻（64 位签名，分 8 段索引，最大支持 7）
+NEAR_DUP_DISTANCE = min(7, int(os.getenv("NEAR_DUP_DISTANCE", "6")))
+# 签名保留时间（秒）
+NEAR_DUP_RETENTION = int(os.getenv("NEAR_DUP_RETENTION", str(3 * 24 * 3600)))
+
+_NOISE = re.compile(r"[\s\W_]+", re.UNICODE)
+_BANDS = 8
+_BAND_BITS = 8
+
+
+def _normalize(text: str) -> str:
+    return _NOISE.sub("", text).lower()
+
+
+def simhash(text: str, ngram: int = 3) -> int:
+    """对字符 n-gram 计算 64 位 SimHash 签名（中文不分词，直接按字符切片）"""
+    text = _normalize(text)
+    if len(text) < ngram:
+        grams = [text] if text else []
+    else:
+        grams = [text[i:i + ngram] for i in range(len(text) - ngram + 1)]
+    weights = [0] * 64
+    for gram in grams:
+        h = int.from_bytes(hashlib.blake2b(gram.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if (h >> bit) & 1 else -1
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def _bands(sig: int) -> List[int]:
+    return [(sig >> (i * _BAND_BITS)) & ((1 << _BAND_BITS) - 1) for i in range(_BANDS)]
+
+
+def _to_signed(sig: int) -> int:
+    """SQLite INTEGER 为有符号 64 位"""
+    return sig - (1 << 64) if sig >= (1 << 63) else sig
+
+
+def _to_unsigned(sig: int) -> int:
+    return sig + (1 << 64) if sig < 0 else sig
+
+
+def article_key(news: Dict[str, Any]) -> str:
+    return hashlib.sha256((news.get("news_title", "") + "\x00" + news.get("news_text", "")).encode("utf-8")).hexdigest()
+
+
+class NearDupIndex:
+    """
+    持久化的 SimHash 签名索引。
+
+    64 位签名切成 8 段 8 位分别建索引：海明距离不超过 7 的两个签名至少有一段完全相同，
+    因此只需比较与任一段相同的候选签名。
+    """
+
+    def __init__(self, path: str = NEAR_DUP_DB_PATH, distance: int = NEAR_DUP_DISTANCE):
+        self.distance = distance
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS signatures (
+                article_key TEXT PRIMARY KEY,
+                sig INTEGER,
+                b0 INTEGER, b1 INTEGER, b2 INTEGER, b3 INTEGER,
+                b4 INTEGER, b5 INTEGER, b6 INTEGER, b7 INTEGER,
+                title TEXT,
+                created REAL
+            )"""
+        )
+        # 文章已覆盖的股票代码（逗号分隔），近似重复的转载里多出的公司据此并入；旧版本的库没有这一列
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(signatures)")}
+        if "codes" not in columns:
+            self.conn.execute("ALTER TABLE signatures ADD COLUMN codes TEXT DEFAULT ''")
+        for i in range(_BANDS):
+            self.conn.execute(f"CREATE INDEX IF NOT EXISTS idx_sig_b{i} ON signatures (b{i})")
+        self.conn.execute("DELETE FROM signatures WHERE created < ?", (time.time() - NEAR_DUP_RETENTION,))
+        self.conn.commit()
+
+    def find(self, sig: int, key: str) -> Optional[Tuple[str, str, int]]:
+        """查找与签名相近的其他文章，返回 (文章键, 标题, 海明距离)；同一篇文章（内容完全相同）不算重复"""
+        where = " OR ".join(f"b{i} = ?" for i in range(_BANDS))
+        rows = self.conn.execute(f"SELECT article_key, sig, title FROM signatures WHERE {where}", _bands(sig)).fetchall()
+        for other_key, other_sig, title in rows:
+            if other_key == key:
+                continue
+            d = hamming(sig, _to_unsigned(other_sig))
+            if d <= self.distance:
+                return other_key, title, d
+        return None
+
+    def add(self, sig: int, key: str, title: str, codes: Set[str] = frozenset()) -> None:
+        columns = ", ".join(f"b{i}" for i in range(_BANDS))
+        self.conn.execute(
+            f"INSERT OR IGNORE INTO signatures (article_key, sig, {columns}, title, created, codes) VALUES ({', '.join('?' * (_BANDS + 5))})",
+            (key, _to_signed(sig), *_bands(sig), title, time.time(), ",".join(sorted(codes))),
+        )
+        self.conn.commit()
+
+    def codes(self, key: str) -> Set[str]:
+        row = self.conn.execute("SELECT codes FROM signatures WHERE article_key = ?", (key,)).fetchone()
+        return set(filter(None, (row[0] or "").split(","))) if row else set()
+
+    def add_codes(self, key: str, codes: Set[str]) -> None:
+        self.conn.execute(
+            "UPDATE signatures SET codes = ? WHERE article_key = ?", (",".join(sorted(self.codes(key) | codes)), key)
+        )
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def collapse_near_duplicates(news_data: List[Dict[str, Any]], index: Optional[NearDupIndex] = None) -> List[Dict[str, Any]]:
+    """
+    去掉与本批或历史新闻近似重复的文章（按 news_title + news_text 的 SimHash 判断）。
+
+    同一篇文章的多条公司记录一起保留或一起去掉；但重复的转载中抽取出保留文章没有的公司时，
+    按 stock_code 把这些公司并入保留的文章（本批内的文章改用其标题、正文，一起分析），不会因此漏掉。
+    保留下来的文章会写入索引，供之后的运行使用。
+    """
+    own_index = index is None
+    index = index or NearDupIndex()
+    articles: Dict[str, List[Dict[str, Any]]] = {}
+    for news in news_data:
+        articles.setdefault(article_key(news), []).append(news)
+    kept: Dict[str, List[Dict[str, Any]]] = {}
+    dropped = merged = 0
+    try:
+        for key, records in articles.items():
+            news = records[0]
+            sig = simhash(news.get("news_title", "") + news.get("news_text", ""))
+            match = index.find(sig, key)
+            codes = {record.get("stock_code", "") for record in records} - {""}
+            if match is None:
+                index.add(sig, key, news.get("news_title", ""), codes)
+                kept[key] = records
+                continue
+            other_key, title, distance = match
+            dropped += 1
+            print(f"近似重复，跳过: {news.get('news_title', '')}（与“{title}”距离 {distance}）")
+            extra = [record for record in records if record.get("stock_code", "") not in index.codes(other_key)]
+            if not extra:
+                continue
+            merged += len(extra)
+            index.add_codes(other_key, {record.get("stock_code", "") for record in extra})
+            if other_key in kept:
+                # 并入本批中保留的文章，一起分析；news_url 不变，分析失败时仍能重试这篇转载
+                base = kept[other_key][0]
+                kept[other_key].extend(
+                    {**record, **{field: base.get(field, "") for field in ("news_time", "news_title", "news_text")}} for record in extra
+                )
+            else:
+                # 保留的文章在之前的运行中已经分析过，这些公司按这篇转载分析
+                kept[key] = extra
+    finally:
+        if own_index:
+            index.close()
+    result = [record for records in kept.values() for record in records]
+    if dropped:
+        print(f"近似重复检测: 去掉 {dropped} 篇文章（并入其中 {merged} 家新增公司），剩余 {len(result)} 条记录")
+    return result
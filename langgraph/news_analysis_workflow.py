@@ -7,6 +7,7 @@ from pydantic import BaseModel, Field
 from crawl4ai import AsyncWebCrawler, CrawlerRunConfig, CacheMode
 from crawl4ai.extraction_strategy import LLMExtractionStrategy
 from crawl4ai.async_configs import LLMConfig
+from concurrent_fetch import fetch_all, CRAWL_MAX_WORKERS, CRAWL_PER_HOST_LIMIT
 from langchain_core.messages import BaseMessage, ToolMessage, SystemMessage
 from langchain_core.tools import tool
 from langgraph.graph.message import add_messages
@@ -99,11 +100,10 @@ async def crawl_and_save_news(url: str = "https://kuaixun.eastmoney.com/ssgs.htm
         # news_links = news_links[:2]
         # print(f"将处理前 20 条新闻\n")
         
-        # Second layer: Extract news content
-        all_news = []
-        for i, news_url in enumerate(news_links, 1):
-            print(f"正在处理第 {i}/{len(news_links)} 条新闻: {news_url}")
-            content_result = await crawler.arun(
+        # Second layer: Extract news content (有限并发抓取)
+        async def fetch_news_content(news_url: str):
+            print(f"正在处理新闻: {news_url}")
+            return await crawler.arun(
                 url=news_url,
                 config=CrawlerRunConfig(
                     word_count_threshold=1,
@@ -133,8 +133,14 @@ async def crawl_and_save_news(url: str = "https://kuaixun.eastmoney.com/ssgs.htm
                     cache_mode=CacheMode.BYPASS,
                 )
             )
-            
-            if content_result.success and content_result.extracted_content:
+
+        print(f"并发数: {CRAWL_MAX_WORKERS}, 单站点并发上限: {CRAWL_PER_HOST_LIMIT}")
+        results = await fetch_all(news_links, fetch_news_content, CRAWL_MAX_WORKERS, CRAWL_PER_HOST_LIMIT)
+
+        all_news = []
+        for i, (news_url, content_result) in enumerate(results, 1):
+            print(f"第 {i}/{len(news_links)} 条新闻: {news_url}")
+            if content_result is not None and content_result.success and content_result.extracted_content:
                 news_content = json.loads(content_result.extracted_content) if isinstance(content_result.extracted_content, str) else content_result.extracted_content
 
                 if isinstance(news_content, list):
@@ -0,0 +1,119 @@
+import os
+import sys
+import time
+import fcntl
+import signal
+import asyncio
+from typing import List
+
+from FinalAgent import chain, AgentState
+from news_sources import enabled_sources
+from seen_store import SeenURLStore
+from browser_pool import close_crawler_pool
+from http_fetch import close_http_fetcher
+from llm_cache import close_llm_cache
+from llm_clients import close_llm_clients
+
+# 轮询配置：列表页 URL（逗号分隔，默认轮询所有已启用来源的列表页）、轮询间隔的初始值 / 下限 / 上限（秒）
+POLL_URLS = [u.strip() for u in os.getenv("POLL_URLS", "").split(",") if u.strip()] or [source.listing_url for source in enabled_sources()]
+POLL_INITIAL_INTERVAL = float(os.getenv("POLL_INITIAL_INTERVAL", "180"))
+POLL_MIN_INTERVAL = float(os.getenv("POLL_MIN_INTERVAL", "60"))
+POLL_MAX_INTERVAL = float(os.getenv("POLL_MAX_INTERVAL", "900"))
+# 防止多个守护进程同时运行的锁文件
+POLL_LOCK_FILE = os.getenv("POLL_LOCK_FILE", "news_daemon.lock")
+
+
+class AdaptiveInterval:
+    """根据每轮的新新闻数量调整轮询间隔：有新内容时加快，连续无新内容时放慢"""
+
+    def __init__(self, initial: float = POLL_INITIAL_INTERVAL, minimum: float = POLL_MIN_INTERVAL, maximum: float = POLL_MAX_INTERVAL):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.value = min(max(initial, minimum), maximum)
+
+    def update(self, new_items: int) -> float:
+        if new_items > 0:
+            self.value = max(self.minimum, self.value / 2)
+        else:
+            self.value = min(self.maximum, self.value * 1.5)
+        return self.value
+
+
+def seen_count() -> int:
+    store = SeenURLStore()
+    try:
+        return len(store)
+    finally:
+        store.close()
+
+
+async def poll_once(url: str, run_lock: asyncio.Lock) -> int:
+    """对一个列表页执行一次 get_url -> crawl -> analyze -> save，返回新处理的新闻数"""
+    # 所有列表页共用一把锁，保证同一时间只有一轮任务在写 news.csv / factor.csv
+    async with run_lock:
+        before = seen_count()
+        initial_state: AgentState = {
+            "messages": [],
+            "news_data": [],
+            "factor_data": [],
+            "failed_urls": [],
+            "url": url,
+            # 每个列表页单独调度，只抓取该列表页，轮询间隔只反映它自己的新内容
+            "only_url": True
+        }
+        try:
+            await chain.ainvoke(initial_state)
+        except Exception as e:
+            print(f"❌ 轮询 {url} 失败：{str(e)}")
+        return seen_count() - before
+
+
+async def poll_source(url: str, run_lock: asyncio.Lock, stop: asyncio.Event) -> None:
+    interval = AdaptiveInterval()
+    while not stop.is_set():
+        started = time.strftime("%Y-%m-%d %H:%M:%S")
+        new_items = await poll_once(url, run_lock)
+        wait = interval.update(new_items)
+        print(f"[{started}] {url}: 新增 {new_items} 条新闻，{wait:.0f} 秒后再次轮询")
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=wait)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_daemon(urls: List[str] = POLL_URLS) -> None:
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    run_lock = asyncio.Lock()
+    print(f"新闻轮询守护进程已启动，监控 {len(urls)} 个列表页：")
+    for url in urls:
+        print(f"- {url}")
+    try:
+        await asyncio.gather(*(poll_source(url, run_lock, stop) for url in urls))
+    finally:
+        await close_crawler_pool()
+        await close_http_fetcher()
+        await close_llm_clients()
+        close_llm_cache()
+    print("新闻轮询守护进程已退出")
+
+
+def main():
+    lock_file = open(POLL_LOCK_FILE, "w")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        print(f"已有守护进程在运行（{POLL_LOCK_FILE} 被占用），退出")
+        sys.exit(1)
+    try:
+        asyncio.run(run_daemon(sys.argv[1:] or POLL_URLS))
+    finally:
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        lock_file.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import os
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+
+from link_extractor import LINK_RULES, extract_article_links
+from page_pruner import CONTENT_SELECTORS, SOURCE_TOKEN_BUDGETS
+from http_fetch import STATIC_HOSTS
+
+
+class NewsSource:
+    """
+    一个新闻来源的适配器。
+
+    参数
+        name： 来源名称，用于 NEWS_SOURCES 配置。
+        listing_url： 新闻列表页 URL。
+        description： 来源说明，用于对话时向用户推荐。
+        link_patterns： 列表页中文章链接的正则（链接提取适配）。
+        article_host： 文章页所在的 host。
+        content_selectors： 文章页正文容器的 CSS 选择器（正文提取适配）。
+        static： 文章页是否为服务端渲染，可走 HTTP 快速通道。
+        token_budget： 文章正文送入 LLM 的 token 上限。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        listing_url: str,
+        description: str,
+        link_patterns: List[str],
+        article_host: str,
+        content_selectors: Optional[List[str]] = None,
+        static: bool = False,
+        token_budget: Optional[int] = None,
+    ):
+        self.name = name
+        self.listing_url = listing_url
+        self.description = description
+        self.link_patterns = link_patterns
+        self.article_host = article_host
+        self.content_selectors = content_selectors or []
+        self.static = static
+        self.token_budget = token_budget
+
+    @property
+    def listing_host(self) -> str:
+        return urlparse(self.listing_url).netloc.lower()
+
+    def extract_links(self, page_result: Any) -> List[str]:
+        return extract_article_links(page_result, self.listing_url, self.link_patterns)
+
+
+SOURCES: Dict[str, NewsSource] = {}
+
+
+def register_source(source: NewsSource) -> None:
+    """注册来源，并把它的链接规则、正文选择器、静态标记和 token 预算写入各模块的配置"""
+    SOURCES[source.name] = source
+    LINK_RULES[source.listing_host] = source.link_patterns
+    if source.content_selectors:
+        CONTENT_SELECTORS[source.article_host] = source.content_selectors
+    if source.static:
+        STATIC_HOSTS.add(source.article_host)
+    if source.token_budget:
+        SOURCE_TOKEN_BUDGETS[source.article_host] = source.token_budget
+
+
+register_source(NewsSource(
+    name="eastmoney_kuaixun",
+    listing_url="https://kuaixun.eastmoney.com/ssgs.html",
+    description="东方财富上市公司快讯",
+    link_patterns=[r"^https?://finance\.eastmoney\.com/a/\d+\.html$"],
+    article_host="finance.eastmoney.com",
+    content_selectors=["#ContentBody", ".txtinfos", ".newsContent"],
+    static=True,
+    token_budget=3000,
+))
+register_source(NewsSource(
+    name="eastmoney_finance",
+    listing_url="https://finance.eastmoney.com/news.html",
+    description="东方财富财经新闻",
+    link_patterns=[r"^https?://finance\.eastmoney\.com/a/\d+\.html$"],
+    article_host="finance.eastmoney.com",
+    content_selectors=["#ContentBody", ".txtinfos", ".newsContent"],
+    static=True,
+    token_budget=3000,
+))
+register_source(NewsSource(
+    name="cls_telegraph",
+    listing_url="https://www.cls.cn/telegraph",
+    description="财联社电报",
+    link_patterns=[r"^https?://www\.cls\.cn/detail/\d+$"],
+    article_host="www.cls.cn",
+    content_selectors=[".detail-content", ".telegraph-content-box"],
+))
+register_source(NewsSource(
+    name="yicai_company",
+    listing_url="https://www.yicai.com/news/company",
+    description="第一财经公司新闻",
+    link_patterns=[r"^https?://www\.yicai\.com/news/\d+\.html$"],
+    article_host="www.yicai.com",
+    content_selectors=["#multi-text", ".m-txt"],
+))
+
+# 启用的来源（逗号分隔的来源名称）
+ENABLED_SOURCES = [n.strip() for n in os.getenv("NEWS_SOURCES", "eastmoney_kuaixun").split(",") if n.strip()]
+
+
+def enabled_sources() -> List[NewsSource]:
+    return [SOURCES[name] for name in ENABLED_SOURCES if name in SOURCES]
+
+
+def get_source(listing_url: str) -> Optional[NewsSource]:
+    """按列表页 URL 查找已注册的来源"""
+    for source in SOURCES.values():
+        if source.listing_url.rstrip("/") == listing_url.rstrip("/"):
+            return source
+    return None
+
+
+def source_urls(url: Optional[str] = None) -> List[str]:
+    """本次运行要抓取的列表页：指定的 URL 在前，其后是其余已启用的来源"""
+    urls = [url] if url else []
+    for source in enabled_sources():
+        if source.listing_url not in urls:
+            urls.append(source.listing_url)
+    return urls
@@ -0,0 +1,167 @@
+import os
+import re
+import html as html_lib
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+from bs4 import BeautifulSoup
+
+# 是否在 LLM 抽取前裁剪页面（PAGE_PRUNE_ENABLED=0 关闭）
+PAGE_PRUNE_ENABLED = os.getenv("PAGE_PRUNE_ENABLED", "1") != "0"
+# 默认每页送入 LLM 的正文 token 上限
+PAGE_TOKEN_BUDGET = int(os.getenv("PAGE_TOKEN_BUDGET", "4000"))
+
+# 各站点的正文 token 上限
+SOURCE_TOKEN_BUDGETS: Dict[str, int] = {
+    "finance.eastmoney.com": 3000,
+}
+
+# 各站点正文容器的 CSS 选择器，按顺序尝试（其余来源由 news_sources.register_source 注册）
+CONTENT_SELECTORS: Dict[str, List[str]] = {
+    "finance.eastmoney.com": ["#ContentBody", ".txtinfos", ".newsContent"],
+}
+
+# 一定不属于正文的标签，以及 class/id 中带有这些词的元素
+BOILERPLATE_TAGS = ["script", "style", "noscript", "nav", "header", "footer", "aside", "form", "iframe"]
+BOILERPLATE_PATTERN = re.compile(
+    r"(?<![a-z])(nav|menu|footer|header|sidebar|related|recommend|hotnews|rank|comment|share|advert|banner|copyright|breadcrumb)(?![a-z])",
+    re.I,
+)
+NEWS_TIME_PATTERN = re.compile(r"\d{4}年\d{1,2}月\d{1,2}日\s*\d{1,2}:\d{2}|\d{4}-\d{2}-\d{2}\s+\d{1,2}:\d{2}")
+
+_CJK = re.compile(r"[\u3000-\u303f\u4e00-\u9fff\uff00-\uffef]")
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数：中文字符按 1 个 token，其余字符按 4 个字符 1 个 token"""
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def truncate_to_tokens(text: str, budget: int) -> str:
+    """按估算的 token 数截取文本开头部分，未超出预算时原样返回"""
+    if estimate_tokens(text) <= budget:
+        return text
+    used = 0
+    for i, ch in enumerate(text):
+        used += 1 if _CJK.match(ch) else 0.25
+        if used > budget:
+            return text[:i]
+    return text
+
+
+def token_budget_for(url: str) -> int:
+    return SOURCE_TOKEN_BUDGETS.get(urlparse(url).netloc.lower(), PAGE_TOKEN_BUDGET)
+
+
+class PrunedPage:
+    """裁剪后的页面：标题、时间和正文段落"""
+
+    def __init__(self, title: str, news_time: str, paragraphs: List[str], tokens_before: int, truncated: bool):
+        self.title = title
+        self.news_time = news_time
+        self.paragraphs = paragraphs
+        self.tokens_before = tokens_before
+        self.truncated = truncated
+
+    @property
+    def text(self) -> str:
+        head = [line for line in (self.title, self.news_time) if line]
+        return "\n".join(head + self.paragraphs)
+
+    @property
+    def html(self) -> str:
+        """重新拼成最小 HTML，供 crawl4ai 以 raw: 方式生成 markdown"""
+        parts = ["<html><body>"]
+        if self.title:
+            parts.append(f"<h1>{html_lib.escape(self.title)}</h1>")
+        if self.news_time:
+            parts.append(f"<div>{html_lib.escape(self.news_time)}</div>")
+        parts.extend(f"<p>{html_lib.escape(p)}</p>" for p in self.paragraphs)
+        parts.append("</body></html>")
+        return "".join(parts)
+
+    @property
+    def tokens_after(self) -> int:
+        return estimate_tokens(self.text)
+
+    def report(self) -> str:
+        saved = self.tokens_before - self.tokens_after
+        ratio = saved / self.tokens_before if self.tokens_before else 0
+        note = "，已截断" if self.truncated else ""
+        return f"页面裁剪: {self.tokens_before} → {self.tokens_after} tokens（节省 {saved}，{ratio:.0%}{note}）"
+
+
+def _strip_boilerplate(soup: BeautifulSoup) -> None:
+    for tag in soup(BOILERPLATE_TAGS):
+        tag.decompose()
+    for tag in soup.find_all(True):
+        if tag.decomposed or tag.name in ("html", "body"):
+            continue
+        marker = " ".join(tag.get("class") or []) + " " + (tag.get("id") or "")
+        if BOILERPLATE_PATTERN.search(marker):
+            tag.decompose()
+
+
+def _find_main_content(soup: BeautifulSoup, url: str):
+    """先按站点选择器查找正文容器，找不到时选 <p> 文本最多的元素"""
+    for selector in CONTENT_SELECTORS.get(urlparse(url).netloc.lower(), []):
+        node = soup.select_one(selector)
+        if node is not None and node.get_text(strip=True):
+            return node
+
+    scores: Dict[int, int] = {}
+    nodes = {}
+    for p in soup.find_all("p"):
+        parent = p.parent
+        if parent is None:
+            continue
+        scores[id(parent)] = scores.get(id(parent), 0) + len(p.get_text(strip=True))
+        nodes[id(parent)] = parent
+    if not scores:
+        return soup.body or soup
+    return nodes[max(scores, key=scores.get)]
+
+
+def prune_page(html: str, url: str, token_budget: Optional[int] = None) -> Optional[PrunedPage]:
+    """
+    在 LLM 抽取前裁剪页面：定位正文、去掉导航/相关新闻/页脚等模板内容，并按 token 预算截断。
+
+    参数
+        html： 页面 HTML。
+        url： 页面 URL，用于选择站点规则和 token 预算。
+        token_budget： 正文 token 上限，默认按站点从 SOURCE_TOKEN_BUDGETS 中选取。
+
+    返回值
+        PrunedPage；找不到任何正文时返回 None，调用方应退回使用整页内容。
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    tokens_before = estimate_tokens(soup.get_text("\n", strip=True))
+
+    h1 = soup.find("h1")
+    title = h1.get_text(strip=True) if h1 else (soup.title.get_text(strip=True) if soup.title else "")
+    time_match = NEWS_TIME_PATTERN.search(soup.get_text(" ", strip=True))
+    news_time = time_match.group(0) if time_match else ""
+
+    _strip_boilerplate(soup)
+    main = _find_main_content(soup, url)
+    paragraphs = [p.get_text(strip=True) for p in main.find_all("p")] or main.get_text("\n", strip=True).split("\n")
+    paragraphs = [p for p in paragraphs if p]
+    if not paragraphs:
+        return None
+
+    budget = token_budget or token_budget_for(url)
+    used = estimate_tokens(title) + estimate_tokens(news_time)
+    kept, truncated = [], False
+    for p in paragraphs:
+        tokens = estimate_tokens(p)
+        if used + tokens > budget:
+            # 单段超出剩余预算时按比例截取前半部分
+            remaining = budget - used
+            if remaining > 0:
+                kept.append(p[: max(1, len(p) * remaining // tokens)])
+            truncated = True
+            break
+        kept.append(p)
+        used += tokens
+    return PrunedPage(title, news_time, kept, tokens_before, truncated)
@@ -0,0 +1,173 @@
+import os
+import io
+import csv
+import glob
+import time
+import sqlite3
+import hashlib
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional
+
+# 新闻 / 因子 CSV 的存放目录
+RECORD_STORE_DIR = os.getenv("RECORD_STORE_DIR", ".")
+# 按日期分文件（news-2024-05-01.csv）；RECORD_STORE_ROTATE=none 时一直追加到同一个文件
+RECORD_STORE_ROTATE = os.getenv("RECORD_STORE_ROTATE", "daily")
+# 记录去重键和各文件已确认写入的长度
+RECORD_STORE_INDEX = os.getenv("RECORD_STORE_INDEX", "record_store.db")
+
+
+def record_key(item: Dict[str, Any]) -> str:
+    """
+    去重键：(文章, 股票代码)。新闻记录以 news_url 标识文章；因子记录没有链接，以新闻时间 + 标题 + 正文标识。
+
+    不能只用标题：回购进展、交易异常波动等公告每期标题相同，只按标题去重会把以后各期当作重复丢掉。
+    """
+    article = item.get("news_url", "").strip()
+    if not article:
+        article = "\x00".join(item.get(field, "").strip() for field in ("news_time", "news_title", "news_text"))
+    key = article + "\x00" + item.get("stock_code", "").strip()
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def rotated_path(filename: str, day: Optional[date] = None, directory: str = RECORD_STORE_DIR, rotate: str = RECORD_STORE_ROTATE) -> str:
+    if rotate != "daily":
+        return os.path.join(directory, filename)
+    stem, ext = os.path.splitext(filename)
+    return os.path.join(directory, f"{stem}-{(day or date.today()).isoformat()}{ext}")
+
+
+def history_files(filename: str, directory: str = RECORD_STORE_DIR) -> List[str]:
+    """某类记录的全部历史文件：未分文件时的 filename 本身，加上按日期分出的文件（按日期排序）"""
+    stem, ext = os.path.splitext(filename)
+    paths = [os.path.join(directory, filename)]
+    paths += sorted(glob.glob(os.path.join(directory, f"{stem}-[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]{ext}")))
+    return [path for path in paths if os.path.exists(path)]
+
+
+class RecordStore:
+    """
+    只追加、可从崩溃中恢复的 CSV 记录存储。
+
+    写入前先在 SQLite 索引中记下文件当前的确认长度；每批记录格式化后一次写入并 fsync，
+    再在同一事务中记下去重键和新的确认长度。进程在写入过程中或两步之间退出时，下次写入前会把文件
+    截断到确认长度，既不会留下半行，也不会留下没有去重键的记录（检查点恢复时重新写入）。
+    同一 (文章, 股票代码) 只写入一次，跨运行、跨日期文件都生效。
+    """
+
+    def __init__(self, filename: str, field_mapping: Dict[str, str], index_path: str = RECORD_STORE_INDEX):
+        self.filename = filename
+        self.field_mapping = field_mapping
+        self.count = 0
+        self.duplicates = 0
+        self.conn = sqlite3.connect(index_path)
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS record_keys (
+                store TEXT,
+                key TEXT,
+                path TEXT,
+                created REAL,
+                PRIMARY KEY (store, key)
+            )"""
+        )
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS record_files (
+                path TEXT PRIMARY KEY,
+                size INTEGER
+            )"""
+        )
+        self.conn.commit()
+        self._header_checked: set = set()
+
+    def _committed_size(self, path: str) -> int:
+        """返回文件已确认写入的长度，必要时截掉上次未确认的尾部"""
+        actual = os.path.getsize(path) if os.path.exists(path) else 0
+        row = self.conn.execute("SELECT size FROM record_files WHERE path = ?", (path,)).fetchone()
+        if row is None:
+            # 索引之前就存在的文件（例如旧版本写的 news.csv）按现有内容接着追加
+            return actual
+        if actual > row[0]:
+            print(f"{path} 末尾有 {actual - row[0]} 字节未确认写入（写入中断），已截断")
+            with open(path, "r+b") as f:
+                f.truncate(row[0])
+            actual = row[0]
+        return min(actual, row[0])
+
+    def _align_header(self, path: str, size: int) -> int:
+        """
+        已有文件的表头与当前字段不一致时：只是新增了列的，一次性补齐旧文件（写临时文件后原子替换）；
+        其他情况只打印警告，按原样追加。返回文件的确认长度。
+        """
+        fieldnames = list(self.field_mapping.values())
+        with open(path, newline="", encoding="utf-8") as f:
+            header = next(csv.reader(f), [])
+        if header == fieldnames:
+            return size
+        if not set(header) < set(fieldnames):
+            print(f"{path} 的表头与当前字段不一致，继续追加: {header}")
+            return size
+        tmp = path + ".tmp"
+        with open(path, newline="", encoding="utf-8") as src, open(tmp, "w", newline="", encoding="utf-8") as dst:
+            writer = csv.DictWriter(dst, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(csv.DictReader(src))
+            dst.flush()
+            os.fsync(dst.fileno())
+        new_size = os.path.getsize(tmp)
+        # 先记下新长度再替换：替换前退出时旧文件比确认长度短，不会被截断，下次重新补齐
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO record_files (path, size) VALUES (?, ?)", (path, new_size))
+        os.replace(tmp, path)
+        print(f"{path} 新增列 {[name for name in fieldnames if name not in header]}，已补齐旧数据")
+        return new_size
+
+    def _is_new(self, key: str) -> bool:
+        return self.conn.execute(
+            "SELECT 1 FROM record_keys WHERE store = ? AND key = ?", (self.filename, key)
+        ).fetchone() is None
+
+    def append(self, items: Iterable[Dict[str, Any]]) -> int:
+        """追加一批记录，跳过已写入过的，返回本次实际写入的条数"""
+        rows, keys = [], set()
+        for item in items:
+            key = record_key(item)
+            if key in keys or not self._is_new(key):
+                self.duplicates += 1
+                continue
+            keys.add(key)
+            rows.append({self.field_mapping[k]: item.get(k, "") for k in self.field_mapping})
+        if not rows:
+            return 0
+
+        path = rotated_path(self.filename)
+        size = self._committed_size(path)
+        if size > 0 and path not in self._header_checked:
+            size = self._align_header(path, size)
+        self._header_checked.add(path)
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=list(self.field_mapping.values()))
+        if size == 0:
+            writer.writeheader()
+        writer.writerows(rows)
+        data = buffer.getvalue().encode("utf-8")
+        # 先确认写入前的长度，新建的文件（包括每天第一次写入的分日文件）也能在中断后截断恢复
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO record_files (path, size) VALUES (?, ?)", (path, size))
+        with open(path, "ab") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO record_keys (store, key, path, created) VALUES (?, ?, ?, ?)",
+                [(self.filename, key, path, now) for key in keys],
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO record_files (path, size) VALUES (?, ?)", (path, size + len(data))
+            )
+        self.count += len(rows)
+        return len(rows)
+
+    def close(self) -> None:
+        self.conn.close()
@@ -0,0 +1,338 @@
+import os
+import re
+import sys
+import csv
+from collections import Counter, deque
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from record_store import history_files
+
+# 本地证券主数据（CSV：股票代码、股票简称、公司全称），由交易所官方列表导入：python security_master.py import ...
+SECURITY_MASTER_PATH = os.getenv("SECURITY_MASTER_PATH", "security_master.csv")
+# 抽取时不再让 LLM 识别公司，改由本地主数据标注（EXTRACT_ENTITIES_LOCAL=1 开启，需要主数据文件）
+EXTRACT_ENTITIES_LOCAL = os.getenv("EXTRACT_ENTITIES_LOCAL", "0") == "1"
+
+# 全角字母数字转半角，保持字符串长度不变，便于在原文上定位
+_FULLWIDTH = {code: code - 0xFEE0 for code in range(0xFF01, 0xFF5F)}
+_CODE = re.compile(r"^(\d{5,6})(?:\.(SH|SZ|BJ|HK))?$", re.I)
+# 文本中独立的代码数字串，以及说明它是证券代码的上下文（在 normalize_name 之后的文本上匹配，括号、冒号已转半角）：
+# 带交易所前缀/后缀（SH600000、600000.SH）、跟在“代码”标签之后（股票代码:600000）、单独放在括号里（(600000)、(600000,...)）
+_CODE_IN_TEXT = re.compile(r"(?<!\d)\d{5,6}(?!\d)")
+_CODE_LABEL = re.compile(r"(?:(?<![A-Z])(?:SH|SZ|BJ)|代码:?)$")
+_CODE_SUFFIX = re.compile(r"^\.(?:SH|SZ|BJ)(?![A-Z])")
+_CODE_BRACKETED = (re.compile(r"[(\[【]$"), re.compile(r"^[)\]】,、;/]"))
+
+
+def normalize_name(text: str) -> str:
+    return text.translate(_FULLWIDTH).replace(" ", "").upper()
+
+
+def normalize_code(code: str) -> str:
+    return code.translate(_FULLWIDTH).strip().upper()
+
+
+class Security:
+    """一只证券：代码（带交易所后缀）、简称和公司全称"""
+
+    def __init__(self, code: str, short_name: str, full_name: str = ""):
+        self.code = normalize_code(code)
+        self.short_name = short_name.strip()
+        self.full_name = full_name.strip()
+
+    @property
+    def digits(self) -> str:
+        return self.code.split(".")[0]
+
+    def as_record(self) -> Dict[str, str]:
+        return {
+            "company_involved": self.full_name or self.short_name,
+            "stock_code": self.code,
+            "stock_short_name": self.short_name,
+        }
+
+
+class AhoCorasick:
+    """多模式串匹配自动机：一次扫描找出文本中所有出现的名称"""
+
+    def __init__(self):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.out: List[List[Tuple[int, Any]]] = [[]]
+
+    def add(self, word: str, value: Any) -> None:
+        node = 0
+        for ch in word:
+            if ch not in self.goto[node]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append([])
+                self.goto[node][ch] = len(self.goto) - 1
+            node = self.goto[node][ch]
+        self.out[node].append((len(word), value))
+
+    def build(self) -> None:
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self.goto[node].items():
+                queue.append(child)
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[child] = self.goto[f].get(ch, 0)
+                self.out[child] = self.out[child] + self.out[self.fail[child]]
+
+    def iter(self, text: str) -> Iterator[Tuple[int, int, Any]]:
+        """产出 (起始位置, 结束位置, value)"""
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(ch, 0)
+            for length, value in self.out[node]:
+                yield i - length + 1, i + 1, value
+
+
+class ResolverStats:
+    """实体校验统计"""
+
+    def __init__(self):
+        self.confirmed = 0
+        self.corrected = 0
+        self.unknown = 0
+        self.tagged = 0
+
+    def report(self) -> str:
+        return (
+            f"证券主数据校验: 一致 {self.confirmed} 条，修正/补全 {self.corrected} 条，"
+            f"无法识别 {self.unknown} 条，本地标注 {self.tagged} 条"
+        )
+
+
+class SecurityMaster:
+    """
+    本地 A 股证券主数据，用于在新闻中标注公司、校验和补全 LLM 抽取的代码。
+
+    主数据为 CSV 文件，表头为 股票代码,股票简称,公司全称（或 code,short_name,full_name）。
+    """
+
+    def __init__(self, securities: List[Security]):
+        self.securities = securities
+        self.by_code: Dict[str, Security] = {}
+        self.by_name: Dict[str, Security] = {}
+        digits = Counter(s.digits for s in securities)
+        self.automaton = AhoCorasick()
+        for s in securities:
+            self.by_code[s.code] = s
+            # 不带后缀的代码只在唯一时可用；代码不放进自动机，在 tag 中结合上下文单独识别
+            if digits[s.digits] == 1:
+                self.by_code[s.digits] = s
+            for name in {s.short_name, s.full_name}:
+                if len(name) >= 2:
+                    self.by_name[normalize_name(name)] = s
+                    self.automaton.add(normalize_name(name), s)
+        self.automaton.build()
+        self.stats = ResolverStats()
+
+    @classmethod
+    def load(cls, path: str = SECURITY_MASTER_PATH) -> "SecurityMaster":
+        securities = []
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                code = row.get("股票代码") or row.get("code") or ""
+                short_name = row.get("股票简称") or row.get("short_name") or ""
+                if code and short_name:
+                    securities.append(Security(code, short_name, row.get("公司全称") or row.get("full_name") or ""))
+        return cls(securities)
+
+    def __len__(self) -> int:
+        return len(self.securities)
+
+    def tag(self, text: str) -> List[Security]:
+        """按首次出现的顺序返回文本中提到的证券；重叠的匹配取最靠左、最长的一个"""
+        normalized = normalize_name(text)
+        matches = [(start, -(end - start), end, security) for start, end, security in self.automaton.iter(normalized)]
+        for match in _CODE_IN_TEXT.finditer(normalized):
+            security = self.by_code.get(match.group(0))
+            if security is not None and self._is_code_context(normalized, match.start(), match.end()):
+                matches.append((match.start(), -(match.end() - match.start()), match.end(), security))
+        found: List[Security] = []
+        covered_until = -1
+        for start, _, end, security in sorted(matches, key=lambda m: (m[0], m[1])):
+            if start < covered_until:
+                continue
+            covered_until = end
+            if security not in found:
+                found.append(security)
+        return found
+
+    @staticmethod
+    def _is_code_context(text: str, start: int, end: int) -> bool:
+        """数字串有证券代码的上下文时才认作代码，“增持600000股”中的股数等不算"""
+        before, after = text[max(0, start - 3):start], text[end:end + 4]
+        if _CODE_LABEL.search(before) or _CODE_SUFFIX.match(after):
+            return True
+        return bool(_CODE_BRACKETED[0].search(before) and _CODE_BRACKETED[1].match(after))
+
+    def lookup(self, record: Dict[str, Any]) -> Optional[Security]:
+        """先按公司全称、简称查找，最后才相信代码（LLM 更容易编错代码）"""
+        for name in (record.get("company_involved", ""), record.get("stock_short_name", "")):
+            security = self.by_name.get(normalize_name(name or ""))
+            if security is not None:
+                return security
+        return self.by_code.get(normalize_code(record.get("stock_code", "") or ""))
+
+    def resolve(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        """校验并补全一条 NewsContent 记录的公司字段，无法识别时原样返回"""
+        security = self.lookup(record)
+        if security is None:
+            self.stats.unknown += 1
+            return record
+        resolved = {**record, **security.as_record()}
+        if resolved["stock_code"] == normalize_code(record.get("stock_code", "") or ""):
+            self.stats.confirmed += 1
+        else:
+            self.stats.corrected += 1
+        return resolved
+
+    def expand(self, article: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """只含时间、标题、正文的文章记录，按本地标注的公司展开成每家公司一条记录"""
+        securities = self.tag(article.get("news_title", "") + "\n" + article.get("news_text", ""))
+        self.stats.tagged += len(securities)
+        return [{**article, **security.as_record()} for security in securities]
+
+
+_master: Optional[SecurityMaster] = None
+_master_loaded = False
+
+
+def get_security_master() -> Optional[SecurityMaster]:
+    """返回进程内共享的证券主数据，没有主数据文件时返回 None"""
+    global _master, _master_loaded
+    if not _master_loaded:
+        _master_loaded = True
+        if os.path.exists(SECURITY_MASTER_PATH):
+            _master = SecurityMaster.load(SECURITY_MASTER_PATH)
+            print(f"已加载证券主数据 {len(_master)} 条: {SECURITY_MASTER_PATH}")
+    return _master
+
+
+# 交易所官网导出的上市公司列表中可能出现的列名（上交所、深交所、北交所各不相同）
+_LIST_CODE_COLUMNS = ("A股代码", "证券代码", "股票代码", "公司代码", "code")
+_LIST_SHORT_COLUMNS = ("A股简称", "证券简称", "股票简称", "公司简称", "short_name")
+_LIST_FULL_COLUMNS = ("公司全称", "公司名称", "中文全称", "full_name")
+
+
+def exchange_suffix(digits: str) -> str:
+    """按代码段推断交易所后缀：6、9 开头为上交所，0、2、3 开头为深交所，4、8、920 开头为北交所"""
+    if digits.startswith("92") or digits[:1] in ("4", "8"):
+        return "BJ"
+    if digits[:1] in ("6", "9"):
+        return "SH"
+    if digits[:1] in ("0", "2", "3"):
+        return "SZ"
+    return ""
+
+
+def _first(row: Dict[str, str], columns: Tuple[str, ...]) -> str:
+    for column in columns:
+        if (row.get(column) or "").strip():
+            return row[column].strip()
+    return ""
+
+
+def _read_list(path: str) -> List[Dict[str, str]]:
+    """交易所导出文件另存的 CSV 有 UTF-8 也有 GBK 编码，依次尝试"""
+    for encoding in ("utf-8-sig", "gbk"):
+        try:
+            with open(path, newline="", encoding=encoding) as f:
+                return [{(k or "").strip(): v for k, v in row.items()} for row in csv.DictReader(f)]
+        except UnicodeDecodeError:
+            continue
+    raise ValueError(f"无法识别 {path} 的编码（支持 UTF-8、GBK）")
+
+
+def _write_master(securities: Dict[str, Security], output: str) -> None:
+    with open(output, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["股票代码", "股票简称", "公司全称"])
+        for code, security in sorted(securities.items()):
+            writer.writerow([code, security.short_name, security.full_name])
+
+
+def import_exchange_lists(paths: List[str], output: str = SECURITY_MASTER_PATH) -> int:
+    """
+    由交易所官方公布的上市公司列表生成主数据文件，这是主数据的正式来源。
+
+    列表从上交所（股票列表）、深交所（A股列表）、北交所（上市公司列表）官网下载，另存为 CSV 后传入；
+    代码列取 A股代码/证券代码，简称列取 A股简称/证券简称，全称列取 公司全称/公司名称，
+    交易所后缀按代码段推断。会覆盖已有的主数据文件，返回写入的证券数。
+    """
+    securities: Dict[str, Security] = {}
+    for path in paths:
+        rows = _read_list(path)
+        count = 0
+        for row in rows:
+            digits = normalize_code(_first(row, _LIST_CODE_COLUMNS)).split(".")[0]
+            short_name = _first(row, _LIST_SHORT_COLUMNS)
+            # 深交所列表中只有 B 股的公司 A股代码为空，跳过
+            if not re.fullmatch(r"\d{6}", digits) or not short_name or not exchange_suffix(digits):
+                continue
+            code = f"{digits}.{exchange_suffix(digits)}"
+            securities[code] = Security(code, short_name, _first(row, _LIST_FULL_COLUMNS))
+            count += 1
+        print(f"{path}: 读取 {count} 只证券")
+    _write_master(securities, output)
+    return len(securities)
+
+
+def fill_from_history(paths: List[str], output: str = SECURITY_MASTER_PATH) -> int:
+    """
+    用已有的 news.csv / factor.csv 补充官方列表中没有的证券（例如新上市、尚未更新列表的股票）。
+
+    历史记录中的代码、简称来自 LLM 抽取，可能有误，因此只追加主数据中不存在的代码，
+    不会改动官方列表中的条目；每个代码取出现次数最多的简称、全称。返回新增的证券数。
+    """
+    if not os.path.exists(output):
+        raise FileNotFoundError(f"{output} 不存在，请先用交易所官方列表导入主数据（import 子命令）")
+    master = SecurityMaster.load(output)
+    securities = {s.code: s for s in master.securities}
+    names: Dict[str, Tuple[Counter, Counter]] = {}
+    for path in paths:
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                code = normalize_code(row.get("股票代码", "") or "")
+                if not _CODE.match(code) or "." not in code or code in securities:
+                    continue
+                short_names, full_names = names.setdefault(code, (Counter(), Counter()))
+                if row.get("股票简称"):
+                    short_names[row["股票简称"].strip()] += 1
+                full_name = row.get("涉及公司") or row.get("公司名") or row.get("公司名称") or ""
+                if full_name:
+                    full_names[full_name.strip()] += 1
+    added = 0
+    for code, (short_names, full_names) in names.items():
+        short_name = short_names.most_common(1)[0][0] if short_names else ""
+        # 简称已被官方条目占用的，多半是 LLM 把代码编错了，不补充
+        if not short_name or normalize_name(short_name) in master.by_name:
+            continue
+        securities[code] = Security(code, short_name, full_names.most_common(1)[0][0] if full_names else "")
+        added += 1
+    _write_master(securities, output)
+    return added
+
+
+if __name__ == "__main__":
+    # 用法:
+    #   python security_master.py import sse.csv szse.csv bse.csv   由交易所官方列表生成主数据
+    #   python security_master.py fill [news.csv factor.csv ...]    用历史记录补充官方列表中缺少的代码（不带文件时读取全部历史文件）
+    command, args = (sys.argv[1], sys.argv[2:]) if len(sys.argv) > 1 else ("", [])
+    if command == "import" and args:
+        count = import_exchange_lists(args)
+        print(f"已生成 {SECURITY_MASTER_PATH}: {count} 只证券")
+    elif command == "fill":
+        count = fill_from_history(args or history_files("news.csv") + history_files("factor.csv"))
+        print(f"已补充 {SECURITY_MASTER_PATH}: 新增 {count} 只证券")
+    else:
+        print("用法: python security_master.py import <交易所列表.csv>... | fill [历史文件.csv]...")
+        sys.exit(1)
@@ -0,0 +1,83 @@
+import os
+import sqlite3
+import hashlib
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+# 已处理新闻 URL 的本地存储位置
+SEEN_DB_PATH = os.getenv("SEEN_DB_PATH", "seen_urls.db")
+
+
+def content_hash(records: Iterable[Dict[str, Any]]) -> str:
+    """根据新闻标题和正文计算内容哈希（同一篇新闻的多条公司记录只计一次）"""
+    h = hashlib.sha256()
+    seen = set()
+    for item in records:
+        key = (item.get("news_title", ""), item.get("news_text", ""))
+        if key in seen:
+            continue
+        seen.add(key)
+        h.update(key[0].encode("utf-8"))
+        h.update(b"\x00")
+        h.update(key[1].encode("utf-8"))
+        h.update(b"\x01")
+    return h.hexdigest()
+
+
+class SeenURLStore:
+    """基于 SQLite 的已处理新闻 URL 记录，用于增量抓取"""
+
+    def __init__(self, path: str = SEEN_DB_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS seen_urls (
+                url TEXT PRIMARY KEY,
+                content_hash TEXT,
+                record_count INTEGER,
+                first_seen REAL,
+                last_seen REAL
+            )"""
+        )
+        # 旧版本的库没有 status 列：ok 为正常处理完成，failed 为多次分析失败后放弃
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(seen_urls)")}
+        if "status" not in columns:
+            self.conn.execute("ALTER TABLE seen_urls ADD COLUMN status TEXT DEFAULT 'ok'")
+        self.conn.commit()
+
+    def is_seen(self, url: str) -> bool:
+        row = self.conn.execute("SELECT 1 FROM seen_urls WHERE url = ?", (url,)).fetchone()
+        return row is not None
+
+    def filter_new(self, urls: List[str]) -> List[str]:
+        """返回尚未处理过的 URL，保持原有顺序"""
+        return [url for url in urls if not self.is_seen(url)]
+
+    def get_hash(self, url: str) -> Optional[str]:
+        row = self.conn.execute("SELECT content_hash FROM seen_urls WHERE url = ?", (url,)).fetchone()
+        return row[0] if row else None
+
+    def mark_seen(self, url: str, records: List[Dict[str, Any]], status: str = "ok") -> None:
+        """记录一条已处理的新闻 URL 及其内容哈希；多次分析失败后放弃的文章 status 为 failed"""
+        now = time.time()
+        self.conn.execute(
+            """INSERT INTO seen_urls (url, content_hash, record_count, first_seen, last_seen, status)
+               VALUES (?, ?, ?, ?, ?, ?)
+               ON CONFLICT(url) DO UPDATE SET
+                   content_hash = excluded.content_hash,
+                   record_count = excluded.record_count,
+                   last_seen = excluded.last_seen,
+                   status = excluded.status""",
+            (url, content_hash(records), len(records), now, now, status),
+        )
+        self.conn.commit()
+
+    def forget(self, url: str) -> None:
+        self.conn.execute("DELETE FROM seen_urls WHERE url = ?", (url,))
+        self.conn.commit()
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM seen_urls").fetchone()[0]
+
+    def close(self) -> None:
+        self.conn.close()
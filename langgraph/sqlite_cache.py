@@ -0,0 +1,28 @@
+import time
+import sqlite3
+
+
+# 抽取结果缓存和 LLM 响应缓存共用的过期清理与容量淘汰。
+# 缓存表需要有 key、size、created、last_access 四列。
+
+
+def purge_expired(conn: sqlite3.Connection, table: str, ttl: int) -> None:
+    """删除创建时间超过 ttl 秒的条目"""
+    conn.execute(f"DELETE FROM {table} WHERE created < ?", (time.time() - ttl,))
+    conn.commit()
+
+
+def evict_to_size(conn: sqlite3.Connection, table: str, max_bytes: int) -> None:
+    """总大小超过上限时，按最近访问时间从旧到新淘汰"""
+    total = conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {table}").fetchone()[0]
+    if total <= max_bytes:
+        return
+    rows = conn.execute(f"SELECT key, size FROM {table} ORDER BY last_access ASC").fetchall()
+    evicted = []
+    for key, size in rows:
+        if total <= max_bytes:
+            break
+        evicted.append((key,))
+        total -= size
+    conn.executemany(f"DELETE FROM {table} WHERE key = ?", evicted)
+    conn.commit()
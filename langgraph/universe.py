@@ -0,0 +1,89 @@
+import os
+import re
+import csv
+from typing import Any, Dict, Iterable, List, Optional
+
+from near_dup import article_key
+
+# 关注的股票池：逗号分隔的代码列表，或者每行一个代码 / 带代码列的 CSV（如指数成分股文件）
+UNIVERSE_CODES = os.getenv("UNIVERSE_CODES", "")
+UNIVERSE_PATH = os.getenv("UNIVERSE_PATH", "universe.csv")
+
+_DIGITS = re.compile(r"\d{5,6}")
+
+
+def code_digits(code: str) -> str:
+    """取代码的数字部分：600515.SH、SH600515、600515 都得到 600515"""
+    match = _DIGITS.search(code or "")
+    return match.group(0) if match else ""
+
+
+class UniverseStats:
+    """股票池过滤统计"""
+
+    def __init__(self):
+        self.kept = 0
+        self.skipped = 0
+        self.skipped_articles = 0
+
+    def report(self) -> str:
+        return (
+            f"股票池过滤: 保留 {self.kept} 条公司记录，跳过池外 {self.skipped} 条"
+            f"（其中 {self.skipped_articles} 篇新闻整篇跳过）"
+        )
+
+
+class Universe:
+    """
+    交易股票池：只有池内股票的新闻记录才送去做影响分析。
+
+    代码按数字部分比较，池文件和 LLM 抽取结果中带不带交易所后缀都能匹配。
+    """
+
+    def __init__(self, codes: Iterable[str]):
+        self.codes = {code_digits(code) for code in codes} - {""}
+
+    @classmethod
+    def load(cls, path: str) -> "Universe":
+        """读取池文件：有表头且某列名包含“代码”或 code 时读取该列，否则每行第一个字段视为代码"""
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            rows = list(csv.reader(f))
+        if not rows:
+            return cls([])
+        column = next((i for i, name in enumerate(rows[0]) if "代码" in name or "code" in name.lower()), None)
+        if column is not None:
+            return cls(row[column] for row in rows[1:] if len(row) > column)
+        return cls(row[0] for row in rows if row)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __contains__(self, code: str) -> bool:
+        return code_digits(code) in self.codes
+
+    def filter(self, news_data: List[Dict[str, Any]], stats: Optional[UniverseStats] = None) -> List[Dict[str, Any]]:
+        """去掉池外股票的记录；一篇新闻只剩池内公司时，只分析这些公司"""
+        kept = [news for news in news_data if news.get("stock_code", "") in self]
+        if stats is not None:
+            stats.kept += len(kept)
+            stats.skipped += len(news_data) - len(kept)
+            stats.skipped_articles += len({article_key(news) for news in news_data} - {article_key(news) for news in kept})
+        return kept
+
+
+_universe: Optional[Universe] = None
+_universe_loaded = False
+
+
+def get_universe() -> Optional[Universe]:
+    """返回进程内共享的股票池；UNIVERSE_CODES 和池文件都没有配置时返回 None，即分析全部股票"""
+    global _universe, _universe_loaded
+    if not _universe_loaded:
+        _universe_loaded = True
+        if UNIVERSE_CODES.strip():
+            _universe = Universe(UNIVERSE_CODES.split(","))
+        elif os.path.exists(UNIVERSE_PATH):
+            _universe = Universe.load(UNIVERSE_PATH)
+        if _universe is not None:
+            print(f"已加载股票池: {len(_universe)} 只股票")
+    return _universe